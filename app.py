@@ -1,12 +1,42 @@
 import streamlit as st
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 import io
-import json
 import os
 import hashlib
 import base64
+import copy
+import tempfile
+import threading
+import time
+from concurrent import futures
 from pathlib import Path
 
+from certgen import FONT_FAMILIES, certificate_kwargs, generate_certificate, get_font_cache
+from certgen.render import downscale_template, scale_kwargs
+from certgen import config as cert_config
+from certgen import metrics
+from certgen.snapshot import get_config_snapshot, get_snapshot_cache
+from certgen.storage import get_storage
+from certgen.bulk import generate_all_certificates, generate_merged_pdf
+from certgen.cache import (cached_pdf, cached_render, get_render_cache, get_render_flights,
+                           layout_hash)
+from certgen.encode import (JPEG_SUBSAMPLING, OUTPUT_FORMATS, benchmark_encoders,
+                            encode_certificate, output_extension, output_mime,
+                            output_settings)
+from certgen.participants import ParticipantStore
+from certgen.pdf import pdf_available
+from certgen.pool import RendererBusy
+from certgen.templates import (THUMB_WIDTH, load_template, save_template, template_variant,
+                               template_variants)
+from certgen.fontindex import FONT_UPLOAD_DIR, get_font_index
+from certgen.fonts import available_families
+from certgen.layout import (bake_template, image_field, prune_baked, qr_field,
+                            render_template_path, save_field_image, text_field)
+from certgen.qr import qr_available
+from certgen.roster import import_roster, iter_roster_names, iter_text_names, xlsx_available
+from certgen.verify import get_issued_index
+from certgen.warmup import current_warmup, start_warmup
+
 # ─── Page Config ────────────────────────────────────────────────
 st.set_page_config(
     page_title="AWS Cloud Clubs Mecs – Certificate Generator",
@@ -15,10 +45,14 @@ st.set_page_config(
     initial_sidebar_state="expanded",
 )
 
+metrics.start_from_env()
+
 # ─── Logo helper ────────────────────────────────────────────────
 LOGO_PATH = str(Path(__file__).parent / "assets" / "logo.png")
 
+@st.cache_resource
 def get_base64_image(image_path: str) -> str:
+    """Base64 of an image file, read and encoded once per server process"""
     if os.path.exists(image_path):
         with open(image_path, "rb") as f:
             return base64.b64encode(f.read()).decode()
@@ -27,8 +61,10 @@ def get_base64_image(image_path: str) -> str:
 logo_b64 = get_base64_image(LOGO_PATH)
 
 # ─── Purple AWS Cloud Clubs Theme CSS ───────────────────────────
-st.markdown(
-    f"""
+@st.cache_resource
+def theme_css() -> str:
+    """Theme stylesheet, built and whitespace-collapsed once per server process"""
+    css = f"""
     <style>
     @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800;900&display=swap');
 
@@ -233,9 +269,11 @@ st.markdown(
         font-size: 0.8rem;
     }}
     </style>
-    """,
-    unsafe_allow_html=True,
-)
+    """
+    return ' '.join(css.split())
+
+
+st.markdown(theme_css(), unsafe_allow_html=True)
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -248,21 +286,10 @@ ADMIN_PASSWORD_HASH = hashlib.sha256("admin123".encode()).hexdigest()
 
 # Initialize session state for storing configuration
 if 'config' not in st.session_state:
-    st.session_state.config = {
-        'template_path': None,
-        'template_image': None,
-        'name_x': 500,
-        'name_y': 400,
-        'font_size': 60,
-        'font_color': (0, 0, 0),
-        'font_style': 'Arial',
-        'font_weight': 'Regular',
-        'is_italic': False,
-        'custom_font_path': None,
-        'stroke_width': 0,
-        'stroke_color': (0, 0, 0),
-        'participants': []
-    }
+    st.session_state.config = cert_config.default_config()
+    st.session_state.config['participants'] = ParticipantStore()
+    st.session_state.config['template_image'] = None
+    st.session_state.config['template_sha256'] = None
 
 if 'authenticated' not in st.session_state:
     st.session_state.authenticated = False
@@ -270,59 +297,164 @@ if 'authenticated' not in st.session_state:
 if 'show_login' not in st.session_state:
     st.session_state.show_login = False
 
-# Available font families with fallback options
-FONT_FAMILIES = {
-    'Arial': {
-        'Regular': ['arial.ttf', 'Arial.ttf', '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf'],
-        'Bold': ['arialbd.ttf', 'Arial-Bold.ttf', '/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf'],
-        'Italic': ['ariali.ttf', 'Arial-Italic.ttf', '/usr/share/fonts/truetype/liberation/LiberationSans-Italic.ttf'],
-        'Bold Italic': ['arialbi.ttf', 'Arial-BoldItalic.ttf', '/usr/share/fonts/truetype/liberation/LiberationSans-BoldItalic.ttf']
-    },
-    'Times New Roman': {
-        'Regular': ['times.ttf', 'Times-New-Roman.ttf', '/usr/share/fonts/truetype/liberation/LiberationSerif-Regular.ttf'],
-        'Bold': ['timesbd.ttf', 'Times-New-Roman-Bold.ttf', '/usr/share/fonts/truetype/liberation/LiberationSerif-Bold.ttf'],
-        'Italic': ['timesi.ttf', 'Times-New-Roman-Italic.ttf', '/usr/share/fonts/truetype/liberation/LiberationSerif-Italic.ttf'],
-        'Bold Italic': ['timesbi.ttf', 'Times-New-Roman-BoldItalic.ttf', '/usr/share/fonts/truetype/liberation/LiberationSerif-BoldItalic.ttf']
-    },
-    'Courier New': {
-        'Regular': ['cour.ttf', 'Courier-New.ttf', '/usr/share/fonts/truetype/liberation/LiberationMono-Regular.ttf'],
-        'Bold': ['courbd.ttf', 'Courier-New-Bold.ttf', '/usr/share/fonts/truetype/liberation/LiberationMono-Bold.ttf'],
-        'Italic': ['couri.ttf', 'Courier-New-Italic.ttf', '/usr/share/fonts/truetype/liberation/LiberationMono-Italic.ttf'],
-        'Bold Italic': ['courbi.ttf', 'Courier-New-BoldItalic.ttf', '/usr/share/fonts/truetype/liberation/LiberationMono-BoldItalic.ttf']
-    }
-}
+@st.cache_resource(max_entries=4)
+def load_template_image(path, mtime_ns, size):
+    """Decode a template once per (path, mtime, size), shared by all sessions.
+
+    Returns (image, sha256). The image is treated as read-only: callers copy
+    it before drawing, so sessions only ever hold a reference.
+    """
+    with metrics.timed('template_load'):
+        with open(path, 'rb') as f:
+            data = f.read()
+        img = load_template(io.BytesIO(data))
+    return img, hashlib.sha256(data).hexdigest()
+
+
+def get_template(path):
+    """Return the shared (image, sha256) for path, or (None, None) if missing"""
+    if not path:
+        return None, None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None, None
+    return load_template_image(path, stat.st_mtime_ns, stat.st_size)
+
+
+@st.cache_resource(max_entries=4)
+def load_preview_template(path, template_sha256):
+    """Downscaled copy of the template for live previews, one per template hash"""
+    template_img, _ = get_template(path)
+    return downscale_template(template_img)
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def render_preview(name, kwargs, path, template_sha256):
+    """Render a low-resolution preview as JPEG bytes; repeated settings are free"""
+    preview_template, scale = load_preview_template(path, template_sha256)
+    preview = generate_certificate(name, preview_template, **scale_kwargs(kwargs, scale))
+    return encode_certificate(preview, 'JPEG', {'jpeg_quality': 85, 'jpeg_subsampling': '4:4:4'})
+
+
+def load_render_template():
+    """Load the template certificates are drawn on, static fields baked in"""
+    config = st.session_state.config
+    render_path = render_template_path(config)
+    template_img, template_sha = get_template(render_path)
+    config['render_template_path'] = render_path
+    config['template_image'] = template_img
+    config['template_sha256'] = template_sha
+    return template_img
+
+
+def use_suggestion(name):
+    """Put a suggested participant name into the download name box"""
+    st.session_state.download_name_input = name
+
+
+def web_render_template(config):
+    """(path, scale) of the web variant with static fields baked in, or (None, None)"""
+    variants = template_variants(config['template_path']) if config.get('template_path') else {}
+    web, master = variants.get('web'), variants.get('print')
+    if not web or not master or web['width'] >= master['width'] or not os.path.exists(web['path']):
+        return None, None
+    scale = web['width'] / master['width']
+    return bake_template(web['path'], config.get('fields'), scale), scale
+
+
+def display_certificate(name, certificate_bytes):
+    """Screen-sized copy of a certificate, rendered on the template's web variant.
+
+    Rendered inline rather than on the pool: at web size it costs a few
+    milliseconds, so it never queues behind full-size renders or fails with
+    RendererBusy. Falls back to the full certificate for templates saved
+    without variants.
+    """
+    config = st.session_state.config
+    web_path, scale = web_render_template(config)
+    web_img, web_sha = get_template(web_path)
+    if web_img is None:
+        return certificate_bytes
+    return cached_render(name, web_img, scale_kwargs(certificate_kwargs(config), scale), web_sha,
+                         'JPEG', {'jpeg_quality': 85, 'jpeg_subsampling': '4:4:4'})
 
 
 def save_config():
-    """Save configuration to a JSON file"""
-    config_to_save = {
-        'name_x': st.session_state.config['name_x'],
-        'name_y': st.session_state.config['name_y'],
-        'font_size': st.session_state.config['font_size'],
-        'font_color': st.session_state.config['font_color'],
-        'font_style': st.session_state.config.get('font_style', 'Arial'),
-        'font_weight': st.session_state.config.get('font_weight', 'Regular'),
-        'is_italic': st.session_state.config.get('is_italic', False),
-        'custom_font_path': st.session_state.config.get('custom_font_path'),
-        'stroke_width': st.session_state.config.get('stroke_width', 0),
-        'stroke_color': st.session_state.config.get('stroke_color', (0, 0, 0)),
-        'participants': st.session_state.config['participants'],
-        'template_path': st.session_state.config['template_path']
-    }
-    with open('cert_config.json', 'w') as f:
-        json.dump(config_to_save, f)
+    """Save layout settings to the configured store"""
+    previous_layout = layout_hash(certificate_kwargs(get_config_snapshot().layout))
+    get_storage().save_layout(st.session_state.config)
+    get_snapshot_cache().invalidate()
+    # Bake the saved fields now so the first certificate doesn't pay for it. Other
+    # bakes are only removed once stale, as in-flight renders may still read them
+    config = st.session_state.config
+    prune_baked(keep=[render_template_path(config), web_render_template(config)[0]])
+    # Cached renders are keyed on the layout, so a layout change orphans them all
+    if layout_hash(certificate_kwargs(st.session_state.config)) != previous_layout:
+        get_render_cache().clear()
 
 
 def load_config():
-    """Load configuration from JSON file"""
-    if os.path.exists('cert_config.json'):
-        with open('cert_config.json', 'r') as f:
-            config = json.load(f)
-            if 'font_color' in config and isinstance(config['font_color'], list):
-                config['font_color'] = tuple(config['font_color'])
-            if 'stroke_color' in config and isinstance(config['stroke_color'], list):
-                config['stroke_color'] = tuple(config['stroke_color'])
-            st.session_state.config.update(config)
+    """Point the session at the shared config snapshot, copying only on change"""
+    snapshot = get_config_snapshot()
+    if st.session_state.get('config_revision') != snapshot.revision:
+        st.session_state.config.update(copy.deepcopy(dict(snapshot.layout)))
+        st.session_state.config['participants'] = snapshot.participants
+        st.session_state.config_revision = snapshot.revision
+
+
+def update_participants(change):
+    """Apply change(storage) to the stored roster and refresh the snapshot"""
+    result = change(get_storage())
+    get_snapshot_cache().invalidate()
+    return result
+
+
+def new_temp_path(suffix):
+    """A private temporary file, so concurrent admins never overwrite each other's"""
+    fd, path = tempfile.mkstemp(prefix='certgen-', suffix=suffix)
+    os.close(fd)
+    return path
+
+
+def keep_session_file(key, path):
+    """Remember path under key for this session, deleting the file it replaces"""
+    previous = st.session_state.get(key)
+    st.session_state[key] = path
+    if previous and previous != path and os.path.exists(previous):
+        os.remove(previous)
+
+
+def cancel_bulk(cancel_event):
+    """Cancel button callback: stop the running bulk job and say so on the next run"""
+    cancel_event.set()
+    st.session_state.bulk_cancelled = True
+
+
+def run_roster_import(rows):
+    """Import rows into the roster, keeping the report for the next rerun"""
+    status = st.empty()
+
+    def report_progress(rows_read, added):
+        status.caption(f"⏳ {rows_read:,} rows read, {added:,} names added…")
+
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', encoding='utf-8',
+                                     delete=False) as report_file:
+        report = update_participants(lambda storage: import_roster(
+            storage, rows, st.session_state.config['participants'],
+            report_file=report_file, progress=report_progress))
+    previous = st.session_state.get('roster_report')
+    if previous and os.path.exists(previous[1]):
+        os.remove(previous[1])
+    st.session_state.roster_report = (report, report_file.name)
+
+
+def warn_if_custom_font_failed():
+    """Surface a custom font load failure recorded by the font cache"""
+    custom_font_path = st.session_state.config.get('custom_font_path')
+    error = get_font_cache().error_for(custom_font_path) if custom_font_path else None
+    if error:
+        st.warning(f"Failed to load custom font: {error}")
 
 
 def check_password(username, password):
@@ -367,87 +499,6 @@ def logout():
     st.session_state.show_login = False
 
 
-def generate_certificate(name, template_img, x, y, font_size, color,
-                         font_family='Arial', font_weight='Regular', is_italic=False,
-                         custom_font_path=None,
-                         stroke_width=0, stroke_color=(0, 0, 0)):
-    """Generate certificate with name on template"""
-    img = template_img.copy()
-    draw = ImageDraw.Draw(img)
-
-    if isinstance(color, (list, tuple)):
-        color = tuple(int(c) for c in color)
-    else:
-        color = (0, 0, 0)
-
-    if isinstance(stroke_color, (list, tuple)):
-        stroke_color = tuple(int(c) for c in stroke_color)
-    else:
-        stroke_color = (0, 0, 0)
-
-    font = None
-
-    # 1. Try custom font first
-    if custom_font_path and os.path.exists(custom_font_path):
-        try:
-            font = ImageFont.truetype(custom_font_path, int(font_size))
-        except Exception as e:
-            st.warning(f"Failed to load custom font: {e}")
-
-    # 2. Try selected family and weight
-    if font is None:
-        style_key = font_weight
-        if is_italic:
-            if font_weight == 'Bold':
-                style_key = 'Bold Italic'
-            else:
-                style_key = 'Italic'
-        
-        family_config = FONT_FAMILIES.get(font_family, FONT_FAMILIES['Arial'])
-        variant_paths = family_config.get(style_key, family_config['Regular'])
-
-        for font_path in variant_paths:
-            try:
-                font = ImageFont.truetype(font_path, int(font_size))
-                break
-            except Exception:
-                continue
-
-    # 3. Fallback to system defaults
-    if font is None:
-        fallback_fonts = [
-            "arial.ttf",
-            "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-            "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
-            "/System/Library/Fonts/Helvetica.ttc",
-            "/Library/Fonts/Arial.ttf",
-        ]
-        for fallback in fallback_fonts:
-            try:
-                font = ImageFont.truetype(fallback, int(font_size))
-                break
-            except Exception:
-                continue
-
-    if font is None:
-        font = ImageFont.load_default()
-
-    try:
-        bbox = draw.textbbox((0, 0), name, font=font)
-        text_width = bbox[2] - bbox[0]
-    except Exception:
-        text_width = len(name) * (int(font_size) // 2)
-
-    stroke_width = int(stroke_width)
-    if stroke_width > 0:
-        draw.text((int(x) - text_width // 2, int(y)), name, font=font,
-                  fill=color, stroke_width=stroke_width, stroke_fill=stroke_color)
-    else:
-        draw.text((int(x) - text_width // 2, int(y)), name, font=font, fill=color)
-
-    return img
-
-
 # Load saved configuration
 load_config()
 
@@ -478,9 +529,11 @@ with st.sidebar:
     )
     st.markdown("---")
 
+    # Links from certificate QR codes carry ?verify=<id> and open the Verify page
     mode = st.radio(
         "🧭  Navigate",
-        ["📜 Download Certificate", "🔧 Admin Panel"],
+        ["📜 Download Certificate", "🔧 Admin Panel", "🔎 Verify Certificate"],
+        index=2 if st.query_params.get('verify') else 0,
         label_visibility="collapsed",
     )
 
@@ -529,72 +582,124 @@ if mode == "📜 Download Certificate":
         unsafe_allow_html=True,
     )
 
-    # Load template if exists
-    if st.session_state.config.get('template_path') and os.path.exists(st.session_state.config['template_path']):
-        try:
-            st.session_state.config['template_image'] = Image.open(st.session_state.config['template_path'])
-        except Exception as e:
-            st.error(f"Error loading template: {e}")
-            st.session_state.config['template_image'] = None
-
-    # Name input — always visible
-    st.markdown("#### ✍️ Enter your name")
-    user_name = st.text_input("Your Full Name", placeholder="e.g., John Doe",
-                              key="download_name_input", label_visibility="collapsed")
-
-    # No template warning
-    if not st.session_state.config.get('template_image'):
-        st.warning("⚠️ No certificate template has been uploaded yet. Please contact the administrator.")
-        st.info("🔧 Admin: Go to the **Admin Panel** and upload a certificate template.")
-
-    # Generate if name + template exist
-    if user_name and st.session_state.config.get('template_image'):
-        if st.session_state.config.get('participants') and user_name not in st.session_state.config['participants']:
-            st.error("❌ Name not found in participant list. Please check your spelling or contact the administrator.")
-            st.info(f"📋 Total participants registered: {len(st.session_state.config['participants'])}")
-        else:
-            try:
-                cert_color = st.session_state.config.get('font_color', (0, 0, 0))
-                if isinstance(cert_color, list):
-                    cert_color = tuple(cert_color)
-
-                cert_stroke_color = st.session_state.config.get('stroke_color', (0, 0, 0))
-                if isinstance(cert_stroke_color, list):
-                    cert_stroke_color = tuple(cert_stroke_color)
-
-                certificate = generate_certificate(
-                    user_name,
-                    st.session_state.config['template_image'],
-                    st.session_state.config.get('name_x', 500),
-                    st.session_state.config.get('name_y', 400),
-                    st.session_state.config.get('font_size', 60),
-                    cert_color,
-                    st.session_state.config.get('font_family', 'Arial'),
-                    st.session_state.config.get('font_weight', 'Regular'),
-                    st.session_state.config.get('is_italic', False),
-                    st.session_state.config.get('custom_font_path'),
-                    st.session_state.config.get('stroke_width', 0),
-                    cert_stroke_color,
-                )
-
-                st.success("✅ Certificate generated successfully!")
-                st.image(certificate, caption="Your Certificate", use_container_width=True)
-
-                buf = io.BytesIO()
-                certificate.save(buf, format='PNG')
-                buf.seek(0)
-
-                st.download_button(
-                    label="⬇️  Download Certificate",
-                    data=buf,
-                    file_name=f"certificate_{user_name.replace(' ', '_')}.png",
-                    mime="image/png",
-                    type="primary",
-                    use_container_width=True,
-                )
-            except Exception as e:
-                st.error(f"❌ Error generating certificate: {str(e)}")
-                st.info("Please contact the administrator if this error persists.")
+    # Load template if exists (shared decoded copy, session holds a reference)
+    try:
+        load_render_template()
+    except Exception as e:
+        st.error(f"Error loading template: {e}")
+        st.session_state.config['template_image'] = None
+
+    # Everything below depends on the typed name, so keystrokes rerun only
+    # this fragment instead of the whole page
+    @st.fragment
+    def download_form():
+        # Name input — always visible
+        st.markdown("#### ✍️ Enter your name")
+        user_name = st.text_input("Your Full Name", placeholder="e.g., John Doe",
+                                  key="download_name_input", label_visibility="collapsed")
+
+        # No template warning
+        if not st.session_state.config.get('template_image'):
+            st.warning("⚠️ No certificate template has been uploaded yet. Please contact the administrator.")
+            st.info("🔧 Admin: Go to the **Admin Panel** and upload a certificate template.")
+
+        # Generate if name + template exist
+        if user_name and st.session_state.config.get('template_image'):
+            participants = st.session_state.config.get('participants')
+            suggestions = []
+            registered = not participants or user_name in participants
+            if not registered:
+                # Forgive case, accents composed differently and stray spaces
+                name_index = participants.name_index()
+                matches = name_index.find(user_name)
+                if len(matches) == 1:
+                    user_name = matches[0]
+                    registered = True
+                else:
+                    suggestions = matches or name_index.suggest(user_name)
+            metrics.inc('certgen_participant_lookups_total', result='found' if registered else 'not_found')
+            if not registered:
+                metrics.log_request('download', status='not_found', suggestions=len(suggestions))
+                st.error("❌ Name not found in participant list. Please check your spelling or contact the administrator.")
+                if suggestions:
+                    st.markdown("**Did you mean:**")
+                    for i, suggestion in enumerate(suggestions):
+                        st.button(suggestion, key=f"suggestion_{i}", on_click=use_suggestion,
+                                  args=(suggestion,))
+                st.info(f"📋 Total participants registered: {len(participants)}")
+            else:
+                try:
+                    output_format, output_options = output_settings(st.session_state.config)
+                    render_kwargs = certificate_kwargs(st.session_state.config)
+                    with metrics.timed('download', metric=metrics.REQUEST_METRIC) as request_timer:
+                        certificate_bytes = cached_render(
+                            user_name,
+                            st.session_state.config['template_image'],
+                            render_kwargs,
+                            st.session_state.config.get('template_sha256'),
+                            output_format,
+                            output_options,
+                            template_path=st.session_state.config['render_template_path'],
+                        )
+                    metrics.log_request('download', status='ok', format=output_format,
+                                        bytes=len(certificate_bytes),
+                                        duration_ms=round(getattr(request_timer, 'elapsed', 0) * 1000, 2))
+                    warn_if_custom_font_failed()
+
+                    st.success("✅ Certificate generated successfully!")
+                    try:
+                        display_bytes = display_certificate(user_name, certificate_bytes)
+                    except Exception:
+                        # The on-screen copy is a nicety; never let it block the download
+                        metrics.inc('certgen_errors_total', route='display')
+                        display_bytes = certificate_bytes
+                    st.image(display_bytes, caption="Your Certificate", use_container_width=True)
+                    if render_kwargs.get('id_version'):
+                        cert_id = get_issued_index().issue(user_name, render_kwargs['id_version'])
+                        st.caption(f"🔏 Certificate ID: `{cert_id}`")
+
+                    st.download_button(
+                        label="⬇️  Download Certificate",
+                        data=certificate_bytes,
+                        file_name=f"certificate_{user_name.replace(' ', '_')}.{output_extension(output_format)}",
+                        mime=output_mime(output_format),
+                        type="primary",
+                        use_container_width=True,
+                    )
+
+                    if pdf_available():
+                        # PDFs are built on request so plain downloads don't pay for them
+                        if st.button("📄  Prepare PDF for printing", use_container_width=True):
+                            st.session_state.pdf_for = user_name
+                        if st.session_state.get('pdf_for') == user_name:
+                            certificate_pdf = cached_pdf(
+                                user_name,
+                                st.session_state.config['render_template_path'],
+                                st.session_state.config['template_image'],
+                                render_kwargs,
+                                st.session_state.config.get('template_sha256'),
+                            )
+                            st.download_button(
+                                label="⬇️  Download PDF",
+                                data=certificate_pdf,
+                                file_name=f"certificate_{user_name.replace(' ', '_')}.pdf",
+                                mime="application/pdf",
+                                use_container_width=True,
+                            )
+                except RendererBusy as e:
+                    metrics.log_request('download', status='busy', retry_after=e.retry_after)
+                    st.warning(f"⏳ Lots of people are downloading right now. Please retry in {e.retry_after} s.")
+                except futures.TimeoutError:
+                    metrics.inc('certgen_errors_total', route='download')
+                    metrics.log_request('download', status='timeout')
+                    st.error("⌛ Generating your certificate took too long. Please try again in a moment.")
+                except Exception as e:
+                    metrics.inc('certgen_errors_total', route='download')
+                    metrics.log_request('download', status='error', error=str(e))
+                    st.error(f"❌ Error generating certificate: {str(e)}")
+                    st.info("Please contact the administrator if this error persists.")
+
+    download_form()
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -626,16 +731,23 @@ elif mode == "🔧 Admin Panel":
                                          type=['png', 'jpg', 'jpeg'])
 
         if uploaded_file:
-            template_img = Image.open(uploaded_file)
-            st.session_state.config['template_image'] = template_img
-            template_img.save('certificate_template.png')
-            st.session_state.config['template_path'] = 'certificate_template.png'
+            upload_bytes = uploaded_file.getvalue()
+            upload_sha = hashlib.sha256(upload_bytes).hexdigest()
+            # The uploader keeps its file across reruns; only re-save on a new upload
+            if st.session_state.get('template_upload_sha256') != upload_sha:
+                # Normalised once here (mode, orientation, metadata) with web and thumb variants
+                st.session_state.template_upload_path = save_template(upload_bytes)
+                st.session_state.template_upload_sha256 = upload_sha
+            st.session_state.config['template_path'] = st.session_state.template_upload_path
+            load_render_template()
             st.success("Template uploaded successfully!")
-            st.image(template_img, caption="Certificate Template", use_container_width=True)
-        elif st.session_state.config['template_path'] and os.path.exists(st.session_state.config['template_path']):
-            template_img = Image.open(st.session_state.config['template_path'])
-            st.session_state.config['template_image'] = template_img
-            st.image(template_img, caption="Current Certificate Template", use_container_width=True)
+            st.image(template_variant(st.session_state.config['template_path'], 'thumb')[0],
+                     caption="Certificate Template", width=THUMB_WIDTH)
+        else:
+            if load_render_template() is not None:
+                # A thumbnail is enough to check the upload; the live preview shows the design
+                st.image(template_variant(st.session_state.config['template_path'], 'thumb')[0],
+                         caption="Current Certificate Template", width=THUMB_WIDTH)
 
         st.markdown("")
 
@@ -663,18 +775,32 @@ elif mode == "🔧 Admin Panel":
         
         with col2:
             st.write("##### 🔠 Font Settings")
+            # Only families that are installed (or uploaded) are offered
+            font_families = available_families() or list(FONT_FAMILIES.keys())
             font_family = st.selectbox(
                 "Font Family",
-                options=list(FONT_FAMILIES.keys()) + ["Custom Upload"],
-                index=0 if st.session_state.config.get('font_family') not in FONT_FAMILIES else list(FONT_FAMILIES.keys()).index(st.session_state.config['font_family'])
+                options=font_families + ["Custom Upload"],
+                index=0 if st.session_state.config.get('font_family') not in font_families else font_families.index(st.session_state.config['font_family'])
             )
             
             if font_family == "Custom Upload":
                 font_file = st.file_uploader("Upload Font file (.ttf, .otf)", type=['ttf', 'otf'])
                 if font_file:
-                    with open("custom_font.ttf", "wb") as f:
-                        f.write(font_file.read())
-                    st.session_state.config['custom_font_path'] = "custom_font.ttf"
+                    font_bytes = font_file.getvalue()
+                    font_sha = hashlib.sha256(font_bytes).hexdigest()
+                    # Rewriting bumps the font's mtime, which is part of every render
+                    # cache key, so only save when a different file is uploaded
+                    if st.session_state.get('font_upload_sha256') != font_sha:
+                        os.makedirs(FONT_UPLOAD_DIR, exist_ok=True)
+                        font_path = os.path.join(FONT_UPLOAD_DIR,
+                                                 os.path.basename(font_file.name))
+                        with open(font_path, "wb") as f:
+                            f.write(font_bytes)
+                        # Uploaded fonts also join the family list by their own name
+                        get_font_index().refresh()
+                        st.session_state.font_upload_path = font_path
+                        st.session_state.font_upload_sha256 = font_sha
+                    st.session_state.config['custom_font_path'] = st.session_state.font_upload_path
                     st.success("Custom font uploaded!")
                 elif st.session_state.config.get('custom_font_path'):
                     st.info(f"Using: {st.session_state.config['custom_font_path']}")
@@ -704,7 +830,27 @@ elif mode == "🔧 Admin Panel":
         else:
             stroke_color = (0, 0, 0)
 
+        st.markdown("##### 📐 Auto-fit Long Names")
+        fit_to_box = st.checkbox("Shrink names to fit a text box",
+                                 value=bool(st.session_state.config.get('fit_to_box', False)),
+                                 help="The box is centred on the X position and starts at the Y "
+                                      "position. Each name uses the largest font size (up to Font "
+                                      "Size) that fits.")
+        box_width = st.session_state.config.get('box_width', 800)
+        box_height = st.session_state.config.get('box_height', 0)
+        if fit_to_box:
+            col_b1, col_b2 = st.columns(2)
+            with col_b1:
+                box_width = st.number_input("Box Width (px)", min_value=0, value=int(box_width),
+                                            help="0 = no width limit")
+            with col_b2:
+                box_height = st.number_input("Box Height (px)", min_value=0, value=int(box_height),
+                                             help="0 = no height limit")
+
         # Update config
+        st.session_state.config['fit_to_box'] = fit_to_box
+        st.session_state.config['box_width'] = box_width
+        st.session_state.config['box_height'] = box_height
         st.session_state.config['name_x'] = name_x
         st.session_state.config['name_y'] = name_y
         st.session_state.config['font_size'] = font_size
@@ -715,6 +861,147 @@ elif mode == "🔧 Admin Panel":
         st.session_state.config['stroke_width'] = stroke_width
         st.session_state.config['stroke_color'] = stroke_color
 
+        st.markdown("##### 🧩 Additional Fields")
+        st.caption("Event title, date, signature, logo… Text containing {name} is drawn for each "
+                   "person; everything else is baked into the template once.")
+        fields = list(st.session_state.config.get('fields') or [])
+        for i, field in enumerate(fields):
+            col_l1, col_l2 = st.columns([5, 1])
+            with col_l1:
+                if field.get('type') == 'image':
+                    label = f"🖼️ {os.path.basename(field['path'])}, width {field['width']}px"
+                elif field.get('type') == 'qr':
+                    label = f"🔳 QR code, {field['size']}px"
+                else:
+                    label = f"🔤 \"{field['text']}\", {field['font_family']} {field['font_size']}px"
+                st.text(f"{label} at ({field['x']}, {field['y']}), {field['align']}")
+            with col_l2:
+                if st.button("🗑️", key=f"remove_field_{i}", help="Remove this field"):
+                    fields.pop(i)
+                    st.session_state.config['fields'] = fields
+                    st.rerun()
+
+        with st.expander("➕ Add text field"):
+            field_text = st.text_input("Text", key="new_field_text",
+                                       help="Use {name} for the participant's name, e.g. "
+                                            "\"Awarded to {name}\", and {certificate_id} for "
+                                            "their verifiable certificate ID")
+            col_t1, col_t2, col_t3 = st.columns(3)
+            with col_t1:
+                field_x = st.number_input("X", min_value=0, value=int(name_x), key="new_field_x")
+                field_size = st.number_input("Font Size", min_value=8, value=32,
+                                             key="new_field_size")
+            with col_t2:
+                field_y = st.number_input("Y", min_value=0, value=int(name_y) + 120,
+                                          key="new_field_y")
+                field_family = st.selectbox("Font Family", font_families, key="new_field_family")
+            with col_t3:
+                field_align = st.selectbox("Align", ["center", "left", "right"],
+                                           key="new_field_align")
+                field_weight = st.selectbox("Weight", ["Regular", "Bold"], key="new_field_weight")
+            col_t4, col_t5 = st.columns(2)
+            with col_t4:
+                field_color_hex = st.color_picker("Color", "#000000", key="new_field_color")
+            with col_t5:
+                field_italic = st.checkbox("Italic", key="new_field_italic")
+            if st.button("Add text field", disabled=not field_text.strip()):
+                field_color = tuple(int(field_color_hex[i:i + 2], 16) for i in (1, 3, 5))
+                fields.append(text_field(field_text, field_x, field_y, field_size, field_color,
+                                         field_family, field_weight, field_italic, field_align))
+                st.session_state.config['fields'] = fields
+                st.rerun()
+
+        with st.expander("➕ Add image field"):
+            field_image = st.file_uploader("Image (PNG with transparency works best)",
+                                           type=['png', 'jpg', 'jpeg'], key="new_field_image")
+            col_i1, col_i2, col_i3, col_i4 = st.columns(4)
+            with col_i1:
+                image_x = st.number_input("X", min_value=0, value=int(name_x), key="new_image_x")
+            with col_i2:
+                image_y = st.number_input("Y", min_value=0, value=0, key="new_image_y")
+            with col_i3:
+                image_width = st.number_input("Width (px)", min_value=1, value=200,
+                                              key="new_image_width")
+            with col_i4:
+                image_align = st.selectbox("Align", ["center", "left", "right"],
+                                           key="new_image_align")
+            if st.button("Add image field", disabled=field_image is None):
+                image_path = save_field_image(field_image.getvalue())
+                fields.append(image_field(image_path, image_x, image_y, image_width, image_align))
+                st.session_state.config['fields'] = fields
+                st.rerun()
+
+        with st.expander("➕ Add QR code"):
+            st.caption("Encodes each certificate's ID, or a link to this app's Verify page, "
+                       "so anyone can check a certificate is genuine.")
+            col_q1, col_q2, col_q3, col_q4 = st.columns(4)
+            with col_q1:
+                qr_x = st.number_input("X", min_value=0, value=int(name_x), key="new_qr_x")
+            with col_q2:
+                qr_y = st.number_input("Y", min_value=0, value=int(name_y) + 200, key="new_qr_y")
+            with col_q3:
+                qr_size = st.number_input("Size (px)", min_value=40, value=200, key="new_qr_size")
+            with col_q4:
+                qr_align = st.selectbox("Align", ["center", "left", "right"], key="new_qr_align")
+            verify_url = st.text_input("Verification page URL (optional)",
+                                       value=os.environ.get('CERTGEN_VERIFY_URL', ''),
+                                       key="new_qr_url",
+                                       help="This app's public address; the QR code then opens "
+                                            "the Verify page with the ID filled in")
+            if not qr_available():
+                st.info("Install the `qrcode` package to add QR codes.")
+            if st.button("Add QR code", disabled=not qr_available()):
+                fields.append(qr_field(qr_x, qr_y, qr_size, align=qr_align,
+                                       verify_url=verify_url.strip()))
+                st.session_state.config['fields'] = fields
+                st.rerun()
+
+        st.session_state.config['fields'] = fields
+
+        st.markdown("##### 📤 Output Format")
+        current_format, current_options = output_settings(st.session_state.config)
+        col_f1, col_f2 = st.columns(2)
+        with col_f1:
+            output_format = st.selectbox("Download Format", list(OUTPUT_FORMATS),
+                                         index=list(OUTPUT_FORMATS).index(current_format))
+        output_options = dict(current_options)
+        with col_f2:
+            if output_format == 'PNG':
+                output_options['png_compress_level'] = st.slider(
+                    "PNG Compression Level", 0, 9, int(current_options['png_compress_level']),
+                    help="Higher is smaller but slower to encode")
+                output_options['png_optimize'] = st.checkbox(
+                    "Optimize PNG", value=bool(current_options['png_optimize']))
+            elif output_format == 'JPEG':
+                output_options['jpeg_quality'] = st.slider(
+                    "JPEG Quality", 50, 100, int(current_options['jpeg_quality']))
+                output_options['jpeg_subsampling'] = st.selectbox(
+                    "Chroma Subsampling", JPEG_SUBSAMPLING,
+                    index=JPEG_SUBSAMPLING.index(current_options['jpeg_subsampling']),
+                    help="4:4:4 keeps coloured text sharpest")
+            else:
+                output_options['webp_lossless'] = st.checkbox(
+                    "Lossless WebP", value=bool(current_options['webp_lossless']))
+                if not output_options['webp_lossless']:
+                    output_options['webp_quality'] = st.slider(
+                        "WebP Quality", 50, 100, int(current_options['webp_quality']))
+        st.session_state.config['output_format'] = output_format
+        st.session_state.config['output_options'] = output_options
+
+        if st.session_state.config.get('template_image') and st.button("⏱️ Benchmark Encoders"):
+            with st.spinner("Encoding a sample certificate with each option…"):
+                sample = generate_certificate(
+                    "John Doe",
+                    st.session_state.config['template_image'],
+                    **certificate_kwargs(st.session_state.config),
+                )
+                rows = benchmark_encoders(sample)
+            st.dataframe(
+                [{'Option': r['preset'], 'Encode (ms)': r['encode_ms'],
+                  'Size (KiB)': round(r['bytes'] / 1024, 1)} for r in rows],
+                use_container_width=True,
+            )
+
         st.markdown("")
 
         # ── 3. Preview ──
@@ -728,37 +1015,60 @@ elif mode == "🔧 Admin Panel":
             unsafe_allow_html=True,
         )
 
-        col_prev1, col_prev2 = st.columns([3, 1])
-        with col_prev1:
-            preview_name = st.text_input("Preview Name", "John Doe", key="preview_name_input")
-        with col_prev2:
-            st.write("")
-            st.write("")
-            if st.button("🔄 Refresh Preview", use_container_width=True):
-                st.rerun()
-
-        if st.session_state.config['template_image']:
-            preview_cert = generate_certificate(
-                preview_name,
-                st.session_state.config['template_image'],
-                int(name_x), int(name_y), int(font_size),
-                font_color, 
-                font_family=font_family,
-                font_weight=font_weight,
-                is_italic=is_italic,
-                custom_font_path=st.session_state.config.get('custom_font_path'),
-                stroke_width=int(stroke_width), 
-                stroke_color=stroke_color,
-            )
-            st.image(preview_cert,
-                     caption=f"Preview (Pos: {name_x}, {name_y})",
-                     use_container_width=True)
-
-        outline_text = f", Outline: {stroke_width}px" if stroke_width > 0 else ""
-        style_text = f"{font_weight} {'Italic' if is_italic else ''}".strip()
-        st.info(f"💡 Current: {font_family} ({style_text}), Size={font_size}, "
-                f"Position=({name_x}, {name_y}){outline_text}")
-        st.caption("💡 Change settings above and click **Refresh Preview** to see changes.")
+        # Typing a preview name reruns only the preview, not the whole panel
+        @st.fragment
+        def preview_panel():
+            # Settings come from the config: the widgets above don't run on a fragment rerun
+            config = st.session_state.config
+            col_prev1, col_prev2 = st.columns([3, 1])
+            with col_prev1:
+                preview_name = st.text_input("Preview Name", "John Doe", key="preview_name_input")
+            with col_prev2:
+                st.write("")
+                st.write("")
+                full_resolution = st.toggle("Full resolution", key="preview_full_resolution",
+                                            help="Render at the template's real size (slower)")
+
+            # Pick up field edits made above; unchanged fields are a cache lookup
+            load_render_template()
+            if st.session_state.config['template_image']:
+                preview_kwargs = certificate_kwargs(st.session_state.config)
+                if full_resolution:
+                    preview_cert = generate_certificate(
+                        preview_name,
+                        st.session_state.config['template_image'],
+                        **preview_kwargs,
+                    )
+                else:
+                    preview_cert = render_preview(
+                        preview_name,
+                        preview_kwargs,
+                        st.session_state.config['render_template_path'],
+                        st.session_state.config.get('template_sha256'),
+                    )
+                warn_if_custom_font_failed()
+                st.image(preview_cert,
+                         caption=f"Preview (Pos: {config['name_x']}, {config['name_y']})",
+                         use_container_width=True)
+
+            stroke_width = config['stroke_width']
+            outline_text = f", Outline: {stroke_width}px" if stroke_width > 0 else ""
+            style_text = f"{config['font_weight']} {'Italic' if config['is_italic'] else ''}".strip()
+            st.info(f"💡 Current: {config['font_family']} ({style_text}), "
+                    f"Size={config['font_size']}, "
+                    f"Position=({config['name_x']}, {config['name_y']}){outline_text}")
+            st.caption("💡 The preview updates as you change settings; switch on **Full resolution** "
+                       "to check fine detail.")
+            font_stats = get_font_cache().stats()
+            st.caption(f"🔤 Font cache: {font_stats['hits']} hits, {font_stats['misses']} misses, "
+                       f"{font_stats['cached_fonts']} loaded, {font_stats['failed_paths']} unavailable paths")
+            render_stats = get_render_cache().stats()
+            flight_stats = get_render_flights().stats()
+            st.caption(f"🗂️ Render cache: {render_stats['memory_hits']} memory hits, "
+                       f"{render_stats['disk_hits']} disk hits, {render_stats['misses']} misses, "
+                       f"{flight_stats['shared']} duplicate renders saved")
+
+        preview_panel()
 
         st.markdown("")
 
@@ -773,42 +1083,235 @@ elif mode == "🔧 Admin Panel":
             unsafe_allow_html=True,
         )
 
+        participants = st.session_state.config['participants']
+
         new_participant = st.text_input("Add Participant Name")
         if st.button("➕ Add Participant"):
-            if new_participant and new_participant not in st.session_state.config['participants']:
-                st.session_state.config['participants'].append(new_participant)
-                save_config()
+            if new_participant and new_participant not in participants:
+                update_participants(lambda storage: storage.add_participants([new_participant]))
                 st.success(f"Added **{new_participant}**")
                 st.rerun()
 
         st.markdown("##### 📋 Bulk Add")
-        bulk_participants = st.text_area("Enter names (one per line)")
+        roster_types = ['csv', 'txt'] + (['xlsx'] if xlsx_available() else [])
+        roster_file = st.file_uploader(
+            f"Import a roster ({', '.join(t.upper() for t in roster_types)})",
+            type=roster_types, key="roster_upload",
+            help="Names come from the column headed Name or Full Name (or First Name + "
+                 "Last Name); without a header row, from the first column. Duplicates "
+                 "and invalid rows are skipped and reported.")
+        if roster_file is not None and st.button("📥 Import Roster"):
+            try:
+                run_roster_import(iter_roster_names(roster_file, roster_file.name))
+            except Exception as e:
+                st.error(f"❌ Could not read {roster_file.name}: {e}")
+            else:
+                st.rerun()
+        bulk_participants = st.text_area("…or paste names (one per line)")
         if st.button("➕ Add All"):
-            names = [n.strip() for n in bulk_participants.split('\n') if n.strip()]
-            for name in names:
-                if name not in st.session_state.config['participants']:
-                    st.session_state.config['participants'].append(name)
-            save_config()
-            st.success(f"Added **{len(names)}** participants")
+            run_roster_import(iter_text_names(bulk_participants.splitlines()))
             st.rerun()
 
-        if st.session_state.config['participants']:
-            st.markdown(f"##### 👥 Current Participants ({len(st.session_state.config['participants'])})")
-            for i, participant in enumerate(st.session_state.config['participants']):
-                col_p1, col_p2 = st.columns([4, 1])
-                with col_p1:
-                    st.text(participant)
-                with col_p2:
-                    if st.button("🗑️", key=f"remove_{i}"):
-                        st.session_state.config['participants'].remove(participant)
-                        save_config()
-                        st.rerun()
+        if st.session_state.get('roster_report'):
+            report, report_path = st.session_state.roster_report
+            st.success(f"Added **{report.added:,}** of {report.rows:,} rows")
+            skipped = [f"{count:,} {label}" for count, label in
+                       ((report.duplicates, "duplicates"), (report.invalid, "invalid"),
+                        (report.blank, "blank")) if count]
+            if skipped:
+                st.caption("Skipped: " + ", ".join(skipped))
+            if report.problems:
+                st.dataframe(report.problems, use_container_width=True, hide_index=True)
+                if os.path.exists(report_path):
+                    with open(report_path, 'rb') as f:
+                        st.download_button("⬇️  Download skipped rows (CSV)", data=f,
+                                           file_name="roster_import_report.csv",
+                                           mime="text/csv")
+
+        # Searching and paging only rerun this list
+        @st.fragment
+        def participant_list():
+            participants = st.session_state.config['participants']
+            if participants:
+                st.markdown(f"##### 👥 Current Participants ({len(participants)})")
+                col_q, col_size = st.columns([3, 1])
+                with col_q:
+                    participant_query = st.text_input("🔍 Search participants", key="participant_query")
+                with col_size:
+                    page_size = st.selectbox("Per page", [25, 50, 100], key="participant_page_size")
+
+                match_count = participants.count(participant_query)
+                page_count = max(1, -(-match_count // page_size))
+                page_number = st.number_input(f"Page (of {page_count})", min_value=1,
+                                              max_value=page_count, value=1,
+                                              key="participant_page")
+                page_names, _ = participants.page(page_number - 1, page_size, participant_query)
+
+                # Only the rows on screen get widgets
+                for participant in page_names:
+                    col_p1, col_p2 = st.columns([4, 1])
+                    with col_p1:
+                        st.text(participant)
+                    with col_p2:
+                        if st.button("🗑️", key=f"remove_{participant}"):
+                            update_participants(lambda storage: storage.remove_participant(participant))
+                            st.rerun()
+                if participant_query:
+                    st.caption(f"{match_count} matching participants")
+
+        participant_list()
+
+        # ── 5. Bulk Generation ──
+        if st.session_state.config['participants'] and st.session_state.config.get('template_path'):
+            st.markdown("##### 📦 Generate All Certificates")
+            st.caption(f"Renders every participant on {os.cpu_count() or 1} worker processes "
+                       "and streams them into a ZIP.")
+            if st.button("📦 Generate ZIP", use_container_width=True):
+                cancel_event = threading.Event()
+                st.button("⏹️ Cancel", key="bulk_cancel", on_click=cancel_bulk,
+                          args=(cancel_event,), use_container_width=True)
+                zip_path = new_temp_path('.zip')
+                progress_bar = st.progress(0.0, text="Starting workers…")
+
+                def report_progress(done, total, name):
+                    progress_bar.progress(done / total, text=f"{done}/{total} — {name}")
+
+                try:
+                    result = generate_all_certificates(
+                        st.session_state.config['participants'],
+                        st.session_state.config['render_template_path'],
+                        st.session_state.config,
+                        zip_path,
+                        progress=report_progress,
+                        cancel_event=cancel_event,
+                    )
+                except BaseException:
+                    # Also reached when Cancel (or any widget) makes Streamlit stop this run
+                    os.remove(zip_path)
+                    raise
+                if result.cancelled:
+                    os.remove(zip_path)
+                    st.warning(f"⏹️ Cancelled after {result.written} of {result.total} certificates")
+                else:
+                    keep_session_file('bulk_zip_path', zip_path)
+                    st.success(f"✅ Rendered {result.written} of {result.total} certificates")
+                    if result.issued:
+                        st.caption(f"🔏 {result.issued} certificate IDs recorded; the ZIP includes "
+                                   "a signed manifest.json")
+                    if result.errors:
+                        st.error(f"❌ {len(result.errors)} certificates failed "
+                                 "(see errors.txt in the ZIP)")
+                        st.dataframe([{'Name': n, 'Error': e} for n, e in result.errors.items()],
+                                     use_container_width=True)
+
+            if st.session_state.pop('bulk_cancelled', False):
+                st.info("⏹️ Bulk generation cancelled; no ZIP was written.")
+
+            if st.session_state.get('bulk_zip_path') and os.path.exists(st.session_state.bulk_zip_path):
+                with open(st.session_state.bulk_zip_path, 'rb') as f:
+                    st.download_button(
+                        label="⬇️  Download All (ZIP)",
+                        data=f,
+                        file_name="certificates.zip",
+                        mime="application/zip",
+                        use_container_width=True,
+                    )
+
+            if pdf_available():
+                if st.button("📄 Generate Merged PDF", use_container_width=True):
+                    pdf_path = new_temp_path('.pdf')
+                    with st.spinner("Laying out one page per participant…"):
+                        try:
+                            generate_merged_pdf(st.session_state.config['participants'],
+                                                st.session_state.config['render_template_path'],
+                                                st.session_state.config, pdf_path)
+                            keep_session_file('bulk_pdf_path', pdf_path)
+                        except Exception as e:
+                            os.remove(pdf_path)
+                            st.error(f"❌ Error generating PDF: {e}")
+
+                if st.session_state.get('bulk_pdf_path') and os.path.exists(st.session_state.bulk_pdf_path):
+                    with open(st.session_state.bulk_pdf_path, 'rb') as f:
+                        st.download_button(
+                            label="⬇️  Download All (PDF)",
+                            data=f,
+                            file_name="certificates.pdf",
+                            mime="application/pdf",
+                            use_container_width=True,
+                        )
 
         st.markdown("")
+        can_warm = bool(st.session_state.config['participants']
+                        and st.session_state.config.get('template_path')
+                        and os.path.exists(st.session_state.config['template_path']))
+        warm_after_save = st.checkbox("🔥 Pre-render every certificate after saving",
+                                      value=can_warm, disabled=not can_warm,
+                                      key="warm_after_save",
+                                      help="Renders the whole participant list in the background "
+                                           "at low priority, so downloads are served from the cache.")
         if st.button("💾  Save All Settings", type="primary", use_container_width=True):
             save_config()
             st.success("✅ Configuration saved successfully!")
+            if warm_after_save and can_warm:
+                start_warmup(st.session_state.config['participants'],
+                             st.session_state.config['render_template_path'],
+                             st.session_state.config)
+
+        # ── 6. Cache Warm-up ──
+        warmup = current_warmup()
+        if warmup is not None:
+            st.markdown("##### 🔥 Cache Warm-up")
+            fraction = warmup.done / warmup.total if warmup.total else 1.0
+            if warmup.running:
+                eta = warmup.eta()
+                eta_text = f"about {eta:.0f} s until fully warm" if eta is not None else "estimating…"
+                st.progress(fraction, text=f"{warmup.done}/{warmup.total} cached — {eta_text}")
+                col_w1, col_w2 = st.columns(2)
+                with col_w1:
+                    st.button("🔄 Refresh progress", use_container_width=True)
+                with col_w2:
+                    if st.button("⏹️ Stop warm-up", use_container_width=True):
+                        warmup.cancel()
+                        st.rerun()
+            elif warmup.error:
+                st.error(f"❌ Warm-up failed: {warmup.error}")
+            else:
+                status = "stopped" if warmup.cancelled else "complete"
+                st.progress(fraction, text=f"Warm-up {status}: {warmup.rendered} rendered, "
+                                           f"{warmup.skipped} already cached")
+            if warmup.errors:
+                st.caption(f"⚠️ {len(warmup.errors)} names failed to pre-render; "
+                           "they will be rendered on request.")
+
+
+# ═══════════════════════════════════════════════════════════════
+#  PAGE: VERIFY CERTIFICATE
+# ═══════════════════════════════════════════════════════════════
+elif mode == "🔎 Verify Certificate":
+    st.markdown(
+        """
+        <div class="hero-card">
+            <h1 style="margin:0; font-size:2rem;">Verify a Certificate</h1>
+            <p style="color:#D4B0F0; font-size:1rem; margin-top:6px;">
+                Enter the certificate ID printed on the certificate, or scan its QR code 🔏
+            </p>
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
 
+    query = st.text_input("Certificate ID", value=st.query_params.get('verify', ''),
+                          placeholder="e.g., K3QF-7ZP2-MA4D-WX6B", key="verify_id_input")
+    if query:
+        # One indexed lookup; nothing is re-rendered and the roster is not scanned
+        record = get_issued_index().lookup(query)
+        metrics.inc('certgen_verifications_total', result='valid' if record else 'unknown')
+        if record:
+            issued_on = time.strftime('%d %B %Y', time.localtime(record['issued_at']))
+            st.success(f"✅ Genuine certificate issued to **{record['name']}** on {issued_on}.")
+            st.caption(f"ID {record['certificate_id']} · layout {record['version']}")
+        else:
+            st.error("❌ No certificate with this ID was issued here. Check the ID for typos.")
 
 # ═══════════════════════════════════════════════════════════════
 #  FOOTER
@@ -0,0 +1,172 @@
+"""Server CPU per interaction for the Streamlit app.
+
+Starts ``streamlit run`` on a scratch directory (generated template,
+synthetic roster), drives it over the same websocket protocol the browser
+uses and types names into the download box. Reports the server process's
+CPU time and the bytes it sends per keystroke. When the name box sits in a
+fragment the reruns are fragment-scoped, as they are in a browser:
+
+    python -m benchmarks.app_rerun
+    git show HEAD~1:app.py > /tmp/app_before.py
+    python -m benchmarks.app_rerun --app /tmp/app_before.py --app app.py
+
+Linux only: CPU time is read from /proc.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from PIL import Image, ImageDraw
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NAME_WIDGET_KEY = 'download_name_input'
+# Partial names as typed: none registered, so each keystroke runs the lookup
+KEYSTROKES = ('J', 'Jo', 'Joh', 'John', 'John ', 'John D', 'John Do')
+
+
+def _cpu_seconds(pid):
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _seed(directory, participants):
+    img = Image.new('RGB', (1600, 1131), (250, 246, 255))
+    ImageDraw.Draw(img).rectangle((40, 40, 1560, 1091), outline=(123, 45, 142), width=12)
+    img.save(os.path.join(directory, 'certificate_template.png'))
+    rng = random.Random(7)
+    first = ('Ana', 'Bo', 'Chen', 'Dmitri', 'Élodie', 'Fatima', 'Hiro', 'Ines', 'Kofi', 'Lena')
+    last = ('Ngata', 'Okafor', 'Petrov', 'Quispe', 'Rossi', 'Sato', 'Tanaka', 'Ulloa')
+    names = [f"{rng.choice(first)} {rng.choice(last)} {i}" for i in range(participants)]
+    with open(os.path.join(directory, 'cert_config.json'), 'w') as f:
+        json.dump({'template_path': 'certificate_template.png', 'participants': names,
+                   'name_x': 800, 'name_y': 560, 'font_size': 72}, f)
+
+
+async def _drive(port, rounds, cpu_seconds):
+    from streamlit.proto.BackMsg_pb2 import BackMsg
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+    from tornado.websocket import websocket_connect
+
+    conn = await websocket_connect(f"ws://127.0.0.1:{port}/_stcore/stream",
+                                   subprotocols=['streamlit'])
+    found = {}
+
+    async def run(client_state):
+        msg = BackMsg()
+        msg.rerun_script.CopyFrom(client_state)
+        await conn.write_message(msg.SerializeToString(), binary=True)
+        sent = 0
+        while True:
+            data = await conn.read_message()
+            if data is None:
+                raise RuntimeError("server closed the connection")
+            sent += len(data)
+            forward = ForwardMsg()
+            forward.ParseFromString(data)
+            kind = forward.WhichOneof('type')
+            if kind == 'new_session':
+                found['script_hash'] = forward.new_session.main_script_hash
+            elif kind == 'delta' and forward.delta.WhichOneof('type') == 'new_element':
+                element = forward.delta.new_element
+                if (element.WhichOneof('type') == 'text_input'
+                        and element.text_input.id.endswith(NAME_WIDGET_KEY)):
+                    found['widget_id'] = element.text_input.id
+                    found['fragment_id'] = forward.delta.fragment_id
+            elif kind == 'script_finished':
+                return sent
+
+    from streamlit.proto.ClientState_pb2 import ClientState
+
+    await run(ClientState())
+    if 'widget_id' not in found:
+        raise RuntimeError("download name box not found in the app's output")
+
+    def keystroke(value):
+        state = ClientState(page_script_hash=found.get('script_hash', ''),
+                            fragment_id=found['fragment_id'])
+        widget = state.widget_states.widgets.add()
+        widget.id = found['widget_id']
+        widget.string_value = value
+        return state
+
+    # One untimed pass warms caches (suggestion index, fonts, templates)
+    for value in KEYSTROKES:
+        await run(keystroke(value))
+    total_bytes = 0
+    cpu_before, started = cpu_seconds(), time.perf_counter()
+    for i in range(rounds):
+        total_bytes += await run(keystroke(KEYSTROKES[i % len(KEYSTROKES)]))
+    elapsed, cpu = time.perf_counter() - started, cpu_seconds() - cpu_before
+    conn.close()
+    return bool(found['fragment_id']), cpu, total_bytes, elapsed
+
+
+def measure(app_path, rounds=300, participants=5000):
+    """Return per-keystroke server CPU (ms), bytes sent and latency for app_path"""
+    with tempfile.TemporaryDirectory() as scratch:
+        _seed(scratch, participants)
+        port = _free_port()
+        env = dict(os.environ, PYTHONPATH=REPO_ROOT, CERTGEN_POOL_WORKERS='0')
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'streamlit', 'run', os.path.abspath(app_path),
+             '--server.headless', 'true', '--server.port', str(port),
+             '--server.address', '127.0.0.1', '--browser.gatherUsageStats', 'false',
+             '--server.fileWatcherType', 'none'],
+            cwd=scratch, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            deadline = time.monotonic() + 60
+            while True:
+                try:
+                    socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                    break
+                except OSError:
+                    if time.monotonic() > deadline or server.poll() is not None:
+                        raise RuntimeError("streamlit server did not start")
+                    time.sleep(0.2)
+
+            fragment, cpu, total_bytes, elapsed = asyncio.run(
+                _drive(port, rounds, lambda: _cpu_seconds(server.pid)))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+    return {
+        'app': app_path,
+        'fragment': fragment,
+        'cpu_ms': round(cpu * 1000 / rounds, 2),
+        'bytes': total_bytes // rounds,
+        'latency_ms': round(elapsed * 1000 / rounds, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--app', action='append',
+                        help="app script to measure; repeat to compare (default: app.py)")
+    parser.add_argument('-n', '--rounds', type=int, default=300, help="timed keystrokes")
+    parser.add_argument('--participants', type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    print(f"{'app':<32}{'rerun':>10}{'CPU ms':>10}{'KiB sent':>10}{'latency ms':>12}")
+    for app_path in args.app or [os.path.join(REPO_ROOT, 'app.py')]:
+        row = measure(app_path, args.rounds, args.participants)
+        print(f"{os.path.relpath(row['app']):<32}{'fragment' if row['fragment'] else 'full':>10}"
+              f"{row['cpu_ms']:>10.2f}{row['bytes'] / 1024:>10.1f}{row['latency_ms']:>12.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""Check that patch rendering produces the same certificate as a full render.
+
+Run from the repository root:
+
+    python -m benchmarks.patch_equivalence
+
+render_patches and patched_template promise output byte-identical to
+generate_certificate; bulk generation and downloads rely on that. Every
+case renders a certificate both ways on a generated template and compares
+the pixels and the encoded PNG. Cases cover RGB and RGBA templates, plus
+palette and greyscale files loaded the way legacy templates are, stroke
+widths, autofit, names clipped by each image edge and per-person fields
+({name} and {certificate_id} text, overlapping fields, and a QR code when
+the qrcode package is installed). Exits 1 if any case differs.
+"""
+import argparse
+import io
+import itertools
+import os
+import sys
+
+from PIL import Image
+
+from certgen.encode import encode_certificate
+from certgen.layout import qr_field, text_field
+from certgen.qr import qr_available
+from certgen.render import generate_certificate, patched_template, render_patches
+from certgen.templates import load_template
+
+from .render_pipeline import NAMES, QUICK_STROKE_WIDTHS, make_template
+
+SIZE = (800, 600)
+MODES = ('RGB', 'RGBA', 'P', 'L')
+# (x, y) for the name: centred, then pushed past each edge of the template
+POSITIONS = {
+    'centre': (400, 250),
+    'left_edge': (10, 250),
+    'right_edge': (790, 250),
+    'top_edge': (400, -20),
+    'bottom_edge': (400, 585),
+    'outside': (2000, 250),
+}
+
+
+def load_case_template(mode):
+    """A generated template in mode, saved and loaded back as the app does"""
+    if mode in ('RGB', 'RGBA'):
+        img = make_template(SIZE, mode)
+    else:
+        img = make_template(SIZE, 'RGB').convert(mode, palette=Image.Palette.ADAPTIVE)
+    buf = io.BytesIO()
+    img.save(buf, format='PNG')
+    buf.seek(0)
+    return load_template(buf)
+
+
+def field_sets():
+    """Per-person field lists to render alongside the name"""
+    sets = {
+        'none': [],
+        'name_text': [text_field("Awarded to {name}", 400, 360, font_size=28)],
+        'certificate_id': [text_field("ID {certificate_id}", 790, 570, font_size=20,
+                                      align='right')],
+        # Drawn over the name, so both must land in one patch in render order
+        'overlapping': [text_field("{name}", 410, 255, font_size=48, color=(200, 30, 30))],
+    }
+    if qr_available():
+        sets['qr'] = [qr_field(700, 480, size=120)]
+        sets['qr_clipped'] = [qr_field(790, 590, size=120),
+                              text_field("{certificate_id}", 30, 580, font_size=18)]
+    return sets
+
+
+def cases(quick=False):
+    names = ('short', 'long') if quick else tuple(NAMES)
+    fields = field_sets()
+    for mode, position, name_key, stroke_width, fields_key in itertools.product(
+            MODES, POSITIONS, names, QUICK_STROKE_WIDTHS, fields):
+        x, y = POSITIONS[position]
+        kwargs = {'x': x, 'y': y, 'font_size': 64, 'color': (20, 20, 120),
+                  'stroke_width': stroke_width, 'stroke_color': (255, 255, 255),
+                  'fields': fields[fields_key], 'id_version': 'check'}
+        yield f"{mode}/{position}/{name_key}/stroke{stroke_width}/{fields_key}", mode, \
+            NAMES[name_key], kwargs
+        if position == 'centre' and fields_key == 'none':
+            # The autofit path measures and shrinks the font before drawing
+            yield f"{mode}/{position}/{name_key}/stroke{stroke_width}/autofit", mode, \
+                NAMES[name_key], dict(kwargs, max_width=300, max_height=60)
+
+
+def check_case(template, name, kwargs):
+    """Return a description of the first difference, or None if identical"""
+    full = generate_certificate(name, template, **kwargs)
+
+    pasted = template.copy()
+    patches = render_patches(name, template, **kwargs)
+    for box, patch in patches:
+        pasted.paste(patch, box)
+    if pasted.mode != full.mode or pasted.size != full.size:
+        return f"pasted image is {pasted.mode} {pasted.size}, expected {full.mode} {full.size}"
+    if pasted.tobytes() != full.tobytes():
+        return "pixels differ after pasting the patches"
+
+    expected = encode_certificate(full, 'PNG', {})
+    before = template.tobytes()
+    with patched_template(template, patches) as patched:
+        encoded = encode_certificate(patched, 'PNG', {})
+    if template.tobytes() != before:
+        return "patched_template did not restore the template"
+    if encoded != expected:
+        return "encoded PNG differs under patched_template"
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help="fewer names")
+    parser.add_argument('-q', '--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    # IDs only need to match between the two renders; keep the check from
+    # creating a .certgen_secret file in the working directory
+    os.environ.setdefault('CERTGEN_SECRET', 'patch-equivalence-check')
+    if not qr_available() and not args.quiet:
+        print("qrcode is not installed; skipping QR cases", file=sys.stderr)
+
+    templates = {mode: load_case_template(mode) for mode in MODES}
+    checked = 0
+    failures = []
+    for label, mode, name, kwargs in cases(args.quick):
+        error = check_case(templates[mode], name, kwargs)
+        checked += 1
+        if error:
+            failures.append(f"{label}: {error}")
+    for line in failures:
+        print(f"MISMATCH {line}")
+    print(f"{checked - len(failures)}/{checked} cases identical", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,296 @@
+"""Offline benchmark of the certificate rendering pipeline.
+
+Run from the repository root:
+
+    python -m benchmarks.render_pipeline -o results.json
+    python -m benchmarks.render_pipeline --compare baseline.json -o results.json
+
+Templates are generated in memory (no network, no uploaded files), fonts
+come from the FONT_FAMILIES fallbacks plus an optional ``--custom-font``.
+Each case records per-stage timings, taken from the same metrics.timed
+hooks the app exports (template copy, font resolution, textbbox, draw.text,
+encode, plus autofit when used), the end-to-end generate_certificate time
+and the resident memory: current, and the peak during that case (Linux
+resets the peak between cases; elsewhere it is the peak so far). Each batch
+runs in a fresh process so its peak, and that of its largest worker, cover
+that batch only. ``--compare`` flags cases whose median end-to-end time
+regressed by more than ``--threshold``.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, __version__ as PILLOW_VERSION
+
+from certgen import metrics
+from certgen.bulk import generate_all_certificates
+from certgen.encode import encode_certificate
+from certgen.fonts import FONT_FAMILIES, get_font_cache
+from certgen.render import generate_certificate
+
+TEMPLATES = {
+    'small': (800, 600),
+    'a4_150dpi': (1754, 1240),
+    'a4_300dpi': (3508, 2480),
+}
+MODES = ('RGB', 'RGBA')
+NAMES = {
+    'short': "Al Li",
+    'medium': "Jonathan Doe-Smith",
+    'long': "Maria Alejandra Fernández de la Cruz y Montenegro",
+}
+STROKE_WIDTHS = tuple(range(0, 11))
+QUICK_STROKE_WIDTHS = (0, 3, 10)
+BATCH_SIZES = (1, 10, 100)
+
+
+def make_template(size, mode):
+    """A deterministic, non-trivial template (gradient + noise-like pattern)"""
+    width, height = size
+    base = Image.linear_gradient('L').resize(size)
+    pattern = Image.effect_mandelbrot(size, (-2.0, -1.2, 0.8, 1.2), 40)
+    img = Image.merge('RGB', (base, pattern, base.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    if mode == 'RGBA':
+        img.putalpha(255)
+    return img
+
+
+def rss_kb():
+    """Current resident set size in KiB, or None where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError):
+        return None
+
+
+def _ru_maxrss_kb(who):
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is bytes on macOS and KiB elsewhere
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def reset_peak_rss():
+    """Start a new peak-RSS window; False where the peak cannot be reset"""
+    try:
+        # Linux: writing 5 to clear_refs resets VmHWM to the current RSS
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_kb():
+    """Peak RSS in KiB since reset_peak_rss(), or since start where that is unsupported"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return _ru_maxrss_kb(resource.RUSAGE_SELF)
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def time_stages(name, template, kwargs):
+    """Render and encode once through the instrumented pipeline; return seconds per stage"""
+    with metrics.capture() as observations:
+        encode_certificate(generate_certificate(name, template, **kwargs), 'PNG')
+    stages = defaultdict(float)
+    for _, labels, seconds in observations:
+        labels = dict(labels)
+        stage = labels['stage']
+        if 'format' in labels:
+            stage = f"{stage}_{labels['format'].lower()}"
+        stages[stage] += seconds
+    return stages
+
+
+def bench_case(name, template, kwargs, repeat):
+    reset_peak_rss()
+    was_enabled = metrics.enabled()
+    metrics.set_enabled(True)
+    try:
+        stage_runs = [time_stages(name, template, kwargs) for _ in range(repeat)]
+    finally:
+        metrics.set_enabled(was_enabled)
+    # End-to-end times are taken with the timers off, as in production
+    totals = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        generate_certificate(name, template, **kwargs)
+        totals.append(time.perf_counter() - start)
+    return {
+        'stages_ms': {stage: _ms(statistics.median(run.get(stage, 0.0) for run in stage_runs))
+                      for stage in stage_runs[0]},
+        'generate_ms': {
+            'median': _ms(statistics.median(totals)),
+            'min': _ms(min(totals)),
+            'max': _ms(max(totals)),
+        },
+        'rss_kb': rss_kb(),
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+
+def _run_batch(size, template_path, config, out_path, workers):
+    """One bulk run, in its own process so the peaks below cover only this batch"""
+    names = [f"Participant {i:05d}" for i in range(size)]
+    start = time.perf_counter()
+    # Spawned workers are this process's children (forkserver ones are not),
+    # so RUSAGE_CHILDREN sees them
+    result = generate_all_certificates(names, template_path, config, out_path, workers=workers,
+                                       mp_context=multiprocessing.get_context('spawn'))
+    elapsed = time.perf_counter() - start
+    return {
+        'batch_size': size,
+        'workers': workers,
+        'total_ms': _ms(elapsed),
+        'per_name_ms': _ms(elapsed / size),
+        'errors': len(result.errors),
+        'peak_rss_kb': peak_rss_kb(),
+        # Largest single worker; the pool has exited, so all of them are counted
+        'worker_peak_rss_kb': _ru_maxrss_kb(resource.RUSAGE_CHILDREN),
+    }
+
+
+def bench_batches(template, kwargs, batch_sizes, workers):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        template_path = os.path.join(tmp, 'template.png')
+        template.save(template_path)
+        config = {
+            'name_x': kwargs['x'], 'name_y': kwargs['y'], 'font_size': kwargs['font_size'],
+            'font_family': kwargs['font_family'], 'custom_font_path': kwargs.get('custom_font_path'),
+        }
+        for size in batch_sizes:
+            with ProcessPoolExecutor(max_workers=1,
+                                     mp_context=multiprocessing.get_context('spawn')) as runner:
+                results.append(runner.submit(_run_batch, size, template_path, config,
+                                             os.path.join(tmp, 'out.zip'), workers).result())
+    return results
+
+
+def run(args):
+    font_options = [('system', None)]
+    if args.custom_font:
+        font_options.append(('custom', args.custom_font))
+    strokes = QUICK_STROKE_WIDTHS if args.quick else STROKE_WIDTHS
+    templates = {k: v for k, v in TEMPLATES.items() if not args.quick or k != 'a4_300dpi'}
+
+    cases = []
+    for template_name, size in templates.items():
+        for mode in MODES:
+            template = make_template(size, mode)
+            for font_label, custom_font_path in font_options:
+                for name_label, name in NAMES.items():
+                    for stroke_width in strokes:
+                        kwargs = {
+                            'x': size[0] // 2, 'y': size[1] // 2,
+                            'font_size': max(20, size[0] // 25), 'color': (20, 20, 20),
+                            'font_family': 'Arial', 'custom_font_path': custom_font_path,
+                            'stroke_width': stroke_width,
+                        }
+                        case = {
+                            'template': template_name, 'mode': mode, 'font': font_label,
+                            'name_length': name_label, 'stroke_width': stroke_width,
+                        }
+                        case.update(bench_case(name, template, kwargs, args.repeat))
+                        cases.append(case)
+                        if not args.quiet:
+                            print(f"{template_name:<10} {mode:<4} {font_label:<6} "
+                                  f"{name_label:<6} stroke={stroke_width:<2} "
+                                  f"{case['generate_ms']['median']:>9.2f} ms", file=sys.stderr)
+            del template
+
+    batch_template = make_template(TEMPLATES['a4_150dpi'], 'RGB')
+    batch_kwargs = {'x': 877, 'y': 620, 'font_size': 70, 'color': (0, 0, 0),
+                    'font_family': 'Arial', 'custom_font_path': None}
+    batch_sizes = BATCH_SIZES[:2] if args.quick else BATCH_SIZES
+    batches = bench_batches(batch_template, batch_kwargs, batch_sizes, args.workers)
+
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'pillow': PILLOW_VERSION,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeat': args.repeat,
+            'quick': args.quick,
+            'fallback_font_families': sorted(FONT_FAMILIES),
+            'font_cache': get_font_cache().stats(),
+        },
+        'cases': cases,
+        'batches': batches,
+    }
+
+
+def case_key(case):
+    return (case['template'], case['mode'], case['font'], case['name_length'],
+            case['stroke_width'])
+
+
+def compare(baseline, current, threshold):
+    """Return human-readable regressions of current against baseline"""
+    previous = {case_key(case): case for case in baseline.get('cases', [])}
+    regressions = []
+    for case in current['cases']:
+        old = previous.get(case_key(case))
+        if old is None:
+            continue
+        before = old['generate_ms']['median']
+        after = case['generate_ms']['median']
+        if before > 0 and (after - before) / before > threshold:
+            regressions.append(f"{'/'.join(map(str, case_key(case)))}: "
+                               f"{before:.2f} ms -> {after:.2f} ms")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-o', '--output', default='bench_results.json')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1,
+                        help="worker processes for the batch cases")
+    parser.add_argument('--custom-font', help="TTF/OTF file to benchmark as a custom upload")
+    parser.add_argument('--quick', action='store_true',
+                        help="fewer templates, strokes and batch sizes")
+    parser.add_argument('--compare', help="baseline results JSON to check for regressions")
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help="relative slowdown counted as a regression (default 0.15)")
+    parser.add_argument('-q', '--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"{len(results['cases'])} cases written to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
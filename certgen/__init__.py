@@ -0,0 +1,28 @@
+"""Certificate rendering core shared by the Streamlit app and batch jobs.
+
+Importing the package has no side effects and does not load Pillow; the
+rendering helpers below are imported on first attribute access.
+"""
+import importlib
+
+_LAZY_ATTRS = {
+    'FONT_FAMILIES': 'fonts',
+    'get_font_cache': 'fonts',
+    'resolve_font': 'fonts',
+    'certificate_kwargs': 'render',
+    'generate_certificate': 'render',
+    'default_config': 'config',
+    'load_config': 'config',
+    'save_config': 'config',
+}
+
+__all__ = sorted(_LAZY_ATTRS)
+
+
+def __getattr__(name):
+    module = _LAZY_ATTRS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
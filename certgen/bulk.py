@@ -0,0 +1,171 @@
+"""Bulk rendering of every participant: a streamed ZIP or one merged PDF"""
+import os
+import re
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+
+from PIL import Image
+
+from .encode import encode_certificate, output_extension, output_settings
+from .pool import worker_context
+from .render import certificate_kwargs, patched_template, render_patches
+from .templates import load_template
+from .verify import build_manifest, certificate_id, get_issued_index, get_secret
+
+# Per-process state set up once by _init_worker, so the template is decoded
+# once per worker instead of being pickled along with every job.
+_worker_template = None
+_worker_kwargs = None
+_worker_output = None
+
+
+@dataclass
+class BulkResult:
+    """Outcome of a bulk run: files written, per-name errors, cancellation"""
+    written: int = 0
+    total: int = 0
+    errors: dict = field(default_factory=dict)
+    cancelled: bool = False
+    issued: int = 0
+
+
+def certificate_filename(name, ext='png'):
+    """Filename used for a participant's certificate download"""
+    safe = re.sub(r'[\\/:*?"<>|]', '', name).strip().replace(' ', '_')
+    return f"certificate_{safe or 'participant'}.{ext}"
+
+
+def _init_worker(template_path, kwargs, output):
+    global _worker_template, _worker_kwargs, _worker_output
+    _worker_template = load_template(template_path)
+    _worker_kwargs = kwargs
+    _worker_output = output
+
+
+def _render_one(name):
+    # Workers are single-threaded, so the name strip is pasted into the
+    # worker's own template for encoding instead of copying the whole image
+    patches = render_patches(name, _worker_template, **_worker_kwargs)
+    with patched_template(_worker_template, patches) as certificate:
+        return encode_certificate(certificate, *_worker_output)
+
+
+def generate_all_certificates(participants, template_path, config, out,
+                              workers=None, progress=None, cancel_event=None, mp_context=None):
+    """Render every participant on a process pool and stream them into a ZIP.
+
+    ``out`` is a path or writable binary file; entries are written as each
+    render finishes, so the archive is never held in memory. Only a small
+    window of jobs is in flight at once. ``progress(done, total, name)`` is
+    called after each name; setting ``cancel_event`` (or raising from
+    ``progress``) stops the run and drops any queued work. When the layout
+    shows certificate IDs, a signed ``manifest.json`` (plus ``manifest.sig``)
+    listing every ID is added and the IDs are recorded for verification.
+    Workers start with ``mp_context`` (default: pool.worker_context()).
+    """
+    names = list(participants)
+    workers = workers or os.cpu_count() or 1
+    result = BulkResult(total=len(names))
+    if not names:
+        return result
+    # Fail fast here rather than breaking every worker's initializer
+    with Image.open(template_path):
+        pass
+
+    output = output_settings(config)
+    ext = output_extension(output[0])
+    kwargs = certificate_kwargs(config)
+    version = kwargs.get('id_version')
+    if version:
+        get_secret()  # create the key before the workers need it
+    issued = []
+    used_filenames = set()
+    pending = {}
+    queue = iter(names)
+    done = 0
+
+    with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_STORED) as archive, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=mp_context or worker_context(),
+                                initializer=_init_worker,
+                                initargs=(template_path, kwargs, output)) as pool:
+        try:
+            def submit_next():
+                for name in queue:
+                    pending[pool.submit(_render_one, name)] = name
+                    return True
+                return False
+
+            # Encoded images are already compressed, so entries are stored as-is
+            for _ in range(workers * 2):
+                if not submit_next():
+                    break
+
+            while pending:
+                if cancel_event is not None and cancel_event.is_set():
+                    result.cancelled = True
+                    break
+                finished, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = pending.pop(future)
+                    try:
+                        data = future.result()
+                    except Exception as e:
+                        result.errors[name] = str(e)
+                    else:
+                        filename = certificate_filename(name, ext)
+                        stem, suffix = os.path.splitext(filename)
+                        n = 1
+                        while filename in used_filenames:
+                            n += 1
+                            filename = f"{stem}_{n}{suffix}"
+                        used_filenames.add(filename)
+                        archive.writestr(filename, data)
+                        result.written += 1
+                        if version:
+                            issued.append((certificate_id(name, version), name, filename))
+                    done += 1
+                    submit_next()
+                    if progress is not None:
+                        progress(done, result.total, name)
+
+            if result.errors:
+                report = "\n".join(f"{name}\t{error}" for name, error in result.errors.items())
+                archive.writestr("errors.txt", report + "\n")
+            if issued:
+                manifest, signature = build_manifest(issued, version)
+                archive.writestr("manifest.json", manifest)
+                archive.writestr("manifest.sig", signature + "\n")
+                get_issued_index().record((cert_id, name, version) for cert_id, name, _ in issued)
+                result.issued = len(issued)
+        finally:
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    return result
+
+
+def generate_merged_pdf(participants, template_path, config, out):
+    """Write one multi-page PDF for every participant to out (path or file).
+
+    All pages reference a single embedded template, so this runs in-process:
+    per page it only lays out one line of text.
+    """
+    from .pdf import render_pdf
+
+    names = list(participants)
+    kwargs = certificate_kwargs(config)
+    with Image.open(template_path) as template:
+        template.load()
+        data = render_pdf(names, template_path, template, **kwargs)
+    version = kwargs.get('id_version')
+    if version:
+        get_issued_index().record((certificate_id(name, version), name, version)
+                                  for name in names)
+    if hasattr(out, 'write'):
+        out.write(data)
+    else:
+        with open(out, 'wb') as f:
+            f.write(data)
+    return len(data)
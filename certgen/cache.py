@@ -0,0 +1,339 @@
+"""Content-addressed cache of encoded certificates (memory + disk tiers)"""
+import hashlib
+import json
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from . import metrics
+
+CACHE_DIR = '.cert_cache'
+
+
+def normalize_name(name):
+    """Canonical form of a name for cache keys.
+
+    Only NFC is applied: anything stronger (casefolding, whitespace
+    collapsing) would map names that render differently onto one entry.
+    """
+    return unicodedata.normalize('NFC', name)
+
+
+def layout_hash(kwargs):
+    """Stable hash of generate_certificate keyword arguments.
+
+    The custom font's mtime (or the indexed file a family resolves to) is
+    folded in, so re-uploading or installing fonts changes the hash.
+    """
+    from .fonts import find_font_path
+
+    layout = dict(kwargs)
+    custom_font_path = layout.get('custom_font_path')
+    if custom_font_path:
+        try:
+            layout['custom_font_mtime'] = os.stat(custom_font_path).st_mtime_ns
+        except OSError:
+            layout['custom_font_mtime'] = None
+    else:
+        # Installing or removing fonts can change which file a family maps to
+        layout['font_path'] = find_font_path(layout.get('font_family', 'Arial'),
+                                             layout.get('font_weight', 'Regular'),
+                                             layout.get('is_italic', False))
+    encoded = json.dumps(layout, sort_keys=True, default=list).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def cache_key(name, layout, template_sha256, fmt='png'):
+    """Cache key for one rendered certificate"""
+    parts = (normalize_name(name), layout, template_sha256 or '', fmt)
+    return hashlib.sha256('\0'.join(parts).encode()).hexdigest()
+
+
+class RenderCache:
+    """Two-tier LRU cache of encoded certificate bytes.
+
+    The memory tier holds up to ``max_memory_bytes``; the disk tier under
+    ``directory`` holds up to ``max_disk_bytes`` and evicts by access time,
+    so entries survive restarts and are shared between server processes.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_memory_bytes=64 * 1024 * 1024,
+                 max_disk_bytes=1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = None
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _scan_disk(self):
+        total = 0
+        entries = []
+        if os.path.isdir(self.directory):
+            for root, _, files in os.walk(self.directory):
+                for filename in files:
+                    path = os.path.join(root, filename)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    total += stat.st_size
+                    entries.append((stat.st_mtime_ns, stat.st_size, path))
+        return total, entries
+
+    def _remember(self, key, data):
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        if len(data) > self.max_memory_bytes:
+            return
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def get(self, key):
+        """Return cached bytes for key, or None"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return data
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(key, data)
+        return data
+
+    def contains(self, key):
+        """True if key is cached in either tier (not counted as a hit)"""
+        with self._lock:
+            if key in self._memory:
+                return True
+        return os.path.exists(self._path(key))
+
+    def put(self, key, data):
+        """Store data under key in both tiers"""
+        with self._lock:
+            self._remember(key, data)
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes, _ = self._scan_disk()
+            else:
+                self._disk_bytes += len(data)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        # Rescan so entries written by other processes are accounted for
+        total, entries = self._scan_disk()
+        entries.sort()
+        target = self.max_disk_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        self._disk_bytes = total
+
+    def clear(self):
+        """Drop every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            _, entries = self._scan_disk()
+            for _, _, path in entries:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._disk_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+            }
+
+
+_render_cache = None
+_render_cache_lock = threading.Lock()
+
+
+def get_render_cache():
+    """Return the process-wide RenderCache"""
+    global _render_cache
+    with _render_cache_lock:
+        if _render_cache is None:
+            _render_cache = RenderCache()
+            metrics.registry.add_collector(_render_cache_metrics)
+        return _render_cache
+
+
+def _render_cache_metrics():
+    stats = _render_cache.stats()
+    yield 'certgen_render_cache_hits_total', {'tier': 'memory'}, stats['memory_hits']
+    yield 'certgen_render_cache_hits_total', {'tier': 'disk'}, stats['disk_hits']
+    yield 'certgen_render_cache_misses_total', {}, stats['misses']
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    runs wait and receive the same result (or exception). Only calls in this
+    process are coalesced.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+                self.executed += 1
+            else:
+                leader = False
+                self.shared += 1
+        if not leader:
+            metrics.inc('certgen_renders_coalesced_total')
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        with self._lock:
+            return {'executed': self.executed, 'shared': self.shared,
+                    'in_flight': len(self._calls)}
+
+
+_render_flights = SingleFlight()
+
+
+def get_render_flights():
+    """Return the process-wide SingleFlight used by cached_render"""
+    return _render_flights
+
+
+def output_key(output_format, options):
+    """Cache key component for an encoder and its options"""
+    return json.dumps([output_format, options], sort_keys=True)
+
+
+def cached_render(name, template_img, kwargs, template_sha256,
+                  output_format='PNG', output_options=None, cache=None, template_path=None):
+    """Return encoded bytes for name, rendering and caching them on a miss.
+
+    With template_path set, misses are rendered on the shared renderer pool
+    (which may raise RendererBusy); otherwise they are rendered inline.
+    """
+    from .encode import encode_certificate
+    from .pool import get_renderer_pool
+    from .render import generate_certificate
+    from .warmup import priority_gate
+
+    cache = cache or get_render_cache()
+    key = cache_key(name, layout_hash(kwargs), template_sha256,
+                    output_key(output_format, output_options or {}))
+    with metrics.timed('cache_lookup'):
+        data = cache.get(key)
+    if data is None:
+        def render():
+            # A concurrent caller may have finished it between our miss and now
+            if cache.contains(key):
+                cached = cache.get(key)
+                if cached is not None:
+                    return cached
+            pool = get_renderer_pool()
+            # Background warm-up pauses while any live render is in progress
+            with priority_gate.live():
+                if template_path and template_sha256 and pool.enabled:
+                    rendered = pool.render(name, template_path, template_sha256, kwargs,
+                                           output_format, output_options)
+                else:
+                    certificate = generate_certificate(name, template_img, **kwargs)
+                    rendered = encode_certificate(certificate, output_format, output_options)
+            cache.put(key, rendered)
+            return rendered
+
+        # Identical requests arriving together share one render
+        data = _render_flights.do(key, render)
+    return data
+
+
+def cached_pdf(name, template_path, template_img, kwargs, template_sha256, cache=None):
+    """Return single-page PDF bytes for name, rendering and caching on a miss"""
+    from .pdf import render_pdf
+
+    cache = cache or get_render_cache()
+    key = cache_key(name, layout_hash(kwargs), template_sha256, 'pdf')
+    data = cache.get(key)
+    if data is None:
+        data = render_pdf([name], template_path, template_img, **kwargs)
+        cache.put(key, data)
+    return data
@@ -0,0 +1,183 @@
+"""Headless command line interface: ``python -m certgen render|batch|import|encoders|verify``
+
+Heavy imports (Pillow, the process pool) happen inside the subcommands so
+that argument parsing and ``--help`` stay fast.
+"""
+import argparse
+import os
+import sys
+
+from .storage import STORE_PATH, open_storage
+
+
+def _template_path(args, config):
+    from .layout import bake_template
+
+    template_path = args.template or config.get('template_path')
+    if not template_path or not os.path.exists(template_path):
+        raise SystemExit(f"certgen: template not found: {template_path!r}")
+    # Static fields are composited once; renders then only draw per-person text
+    return bake_template(template_path, config.get('fields'))
+
+
+def cmd_render(args):
+    from .bulk import certificate_filename
+    from .encode import encode_certificate, output_extension, output_settings
+    from .render import certificate_kwargs, generate_certificate
+    from .templates import load_template
+    from .verify import get_issued_index
+
+    config = open_storage(args.config).read_config()
+    template_path = _template_path(args, config)
+    participants = set(config['participants'])
+    kwargs = certificate_kwargs(config)
+    output_format, output_options = output_settings(config)
+    version = kwargs.get('id_version')
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    template = load_template(template_path)
+    for name in args.names:
+        if participants and name not in participants and not args.force:
+            print(f"certgen: {name!r} is not a registered participant (use --force)",
+                  file=sys.stderr)
+            return 1
+        out_path = os.path.join(args.output_dir,
+                                certificate_filename(name, output_extension(output_format)))
+        certificate = generate_certificate(name, template, **kwargs)
+        with open(out_path, 'wb') as f:
+            f.write(encode_certificate(certificate, output_format, output_options))
+        if version:
+            # Recorded like bulk and download renders, so the ID verifies
+            get_issued_index().issue(name, version)
+        print(out_path)
+    return 0
+
+
+def cmd_batch(args):
+    from .bulk import generate_all_certificates, generate_merged_pdf
+
+    config = open_storage(args.config).read_config()
+    template_path = _template_path(args, config)
+
+    if args.pdf:
+        output = args.output if args.output != 'certificates.zip' else 'certificates.pdf'
+        size = generate_merged_pdf(config['participants'], template_path, config, output)
+        print(f"{len(config['participants'])} pages ({size // 1024} KiB) written to {output}")
+        return 0
+
+    def report(done, total, name):
+        if not args.quiet:
+            print(f"\r{done}/{total}", end='', file=sys.stderr, flush=True)
+
+    result = generate_all_certificates(config['participants'], template_path, config,
+                                       args.output, workers=args.workers, progress=report)
+    if not args.quiet and result.total:
+        print(file=sys.stderr)
+    for name, error in result.errors.items():
+        print(f"certgen: {name}: {error}", file=sys.stderr)
+    print(f"{result.written}/{result.total} certificates written to {args.output}")
+    if result.issued:
+        print(f"{result.issued} certificate IDs recorded (signed manifest.json in the archive)")
+    return 1 if result.errors else 0
+
+
+def cmd_import(args):
+    from .roster import import_roster, iter_roster_names
+
+    storage = open_storage(args.config)
+    existing = storage.read_config()['participants']
+
+    def report_progress(rows_read, added):
+        if not args.quiet:
+            print(f"\r{rows_read} rows, {added} added", end='', file=sys.stderr, flush=True)
+
+    report_file = open(args.report, 'w', newline='', encoding='utf-8') if args.report else None
+    try:
+        with open(args.roster, 'rb') as f:
+            report = import_roster(storage, iter_roster_names(f, args.roster), existing,
+                                   report_file=report_file, progress=report_progress)
+    finally:
+        if report_file is not None:
+            report_file.close()
+    if not args.quiet and report.rows:
+        print(file=sys.stderr)
+    print(f"{report.added} of {report.rows} rows added ({report.duplicates} duplicates, "
+          f"{report.invalid} invalid, {report.blank} blank)")
+    return 0
+
+
+def cmd_encoders(args):
+    from .encode import benchmark_encoders
+    from .render import certificate_kwargs, generate_certificate
+    from .templates import load_template
+
+    config = open_storage(args.config).read_config()
+    template_path = _template_path(args, config)
+    sample = generate_certificate(args.name, load_template(template_path),
+                                  **certificate_kwargs(config))
+
+    print(f"{'preset':<26}{'encode ms':>10}{'KiB':>10}")
+    for row in benchmark_encoders(sample, repeat=args.repeat):
+        print(f"{row['preset']:<26}{row['encode_ms']:>10.1f}{row['bytes'] / 1024:>10.1f}")
+    return 0
+
+
+def cmd_verify(args):
+    import time
+
+    from .verify import get_issued_index
+
+    record = get_issued_index().lookup(args.certificate_id)
+    if record is None:
+        print(f"certgen: {args.certificate_id!r} was not issued here", file=sys.stderr)
+        return 1
+    issued_at = time.strftime('%Y-%m-%d %H:%M', time.localtime(record['issued_at']))
+    print(f"{record['certificate_id']}: {record['name']} (issued {issued_at}, "
+          f"layout {record['version']})")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='certgen', description=__doc__.splitlines()[0])
+    parser.add_argument('-c', '--config', default=None,
+                        help=f"settings store: a SQLite file or a cert_config.json "
+                             f"(default: $CERTGEN_STORE or {STORE_PATH})")
+    parser.add_argument('-t', '--template', help="override the configured template image")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    render = sub.add_parser('render', help="render certificates for the given names")
+    render.add_argument('names', nargs='+')
+    render.add_argument('-o', '--output-dir', default='.')
+    render.add_argument('-f', '--force', action='store_true',
+                        help="render names that are not in the participant list")
+    render.set_defaults(func=cmd_render)
+
+    batch = sub.add_parser('batch', help="render every participant into a ZIP archive")
+    batch.add_argument('-o', '--output', default='certificates.zip')
+    batch.add_argument('-j', '--workers', type=int, default=None,
+                       help="worker processes (default: CPU count)")
+    batch.add_argument('-q', '--quiet', action='store_true')
+    batch.add_argument('--pdf', action='store_true',
+                       help="write one merged PDF instead of a ZIP (needs fpdf2)")
+    batch.set_defaults(func=cmd_batch)
+
+    roster = sub.add_parser('import', help="add participants from a CSV, TXT or XLSX roster")
+    roster.add_argument('roster')
+    roster.add_argument('--report', help="write skipped rows and the reason to this CSV file")
+    roster.add_argument('-q', '--quiet', action='store_true')
+    roster.set_defaults(func=cmd_import)
+
+    encoders = sub.add_parser('encoders', help="benchmark output encoders on the current template")
+    encoders.add_argument('--name', default='John Doe', help="sample name to render")
+    encoders.add_argument('-r', '--repeat', type=int, default=3)
+    encoders.set_defaults(func=cmd_encoders)
+
+    verify = sub.add_parser('verify', help="look up an issued certificate ID")
+    verify.add_argument('certificate_id', help="the ID, or the verification link from a QR code")
+    verify.set_defaults(func=cmd_verify)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
@@ -0,0 +1,71 @@
+"""Loading and saving cert_config.json"""
+import json
+import os
+
+CONFIG_PATH = 'cert_config.json'
+
+DEFAULT_CONFIG = {
+    'template_path': None,
+    'name_x': 500,
+    'name_y': 400,
+    'font_size': 60,
+    'font_color': (0, 0, 0),
+    'font_family': 'Arial',
+    'font_weight': 'Regular',
+    'is_italic': False,
+    'custom_font_path': None,
+    'stroke_width': 0,
+    'stroke_color': (0, 0, 0),
+    'fit_to_box': False,
+    'box_width': 800,
+    'box_height': 0,
+    'fields': [],
+    'output_format': 'PNG',
+    'output_options': {},
+    'participants': [],
+}
+
+# Keys persisted to disk; anything else in a config dict is runtime-only
+SAVED_KEYS = tuple(DEFAULT_CONFIG)
+
+
+def default_config():
+    """Return a fresh copy of the default configuration"""
+    config = dict(DEFAULT_CONFIG)
+    config['participants'] = []
+    config['output_options'] = {}
+    config['fields'] = []
+    return config
+
+
+def read_config(path=CONFIG_PATH):
+    """Return the saved settings in path, or {} if nothing has been saved"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        config = json.load(f)
+    if 'font_color' in config and isinstance(config['font_color'], list):
+        config['font_color'] = tuple(config['font_color'])
+    if 'stroke_color' in config and isinstance(config['stroke_color'], list):
+        config['stroke_color'] = tuple(config['stroke_color'])
+    # Older files stored the family under 'font_style'
+    if 'font_family' not in config and 'font_style' in config:
+        config['font_family'] = config.pop('font_style')
+    return config
+
+
+def load_config(path=CONFIG_PATH):
+    """Return the defaults overlaid with the saved settings in path"""
+    config = default_config()
+    config.update(read_config(path))
+    return config
+
+
+def save_config(config, path=CONFIG_PATH):
+    """Write the persistent keys of config to path atomically"""
+    config_to_save = {key: config.get(key, DEFAULT_CONFIG[key]) for key in SAVED_KEYS}
+    config_to_save['participants'] = list(config_to_save['participants'] or [])
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(config_to_save, f)
+    os.replace(tmp_path, path)
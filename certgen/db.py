@@ -0,0 +1,48 @@
+"""SQLite plumbing shared by the settings store and the issued-ID index.
+
+Each thread gets its own connection, in WAL mode so readers never block
+the writer. Connections run in autocommit; writes go through
+``transaction()``, which starts with BEGIN IMMEDIATE so concurrent writers
+queue on the lock instead of failing when they upgrade.
+"""
+import sqlite3
+import threading
+
+
+class Database:
+    """A SQLite file with one WAL-mode connection per thread"""
+
+    def __init__(self, path, schema=None):
+        self.path = path
+        self._local = threading.local()
+        if schema:
+            self.connect().executescript(schema)
+
+    def connect(self):
+        """This thread's connection, opened on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def transaction(self):
+        """Context manager yielding this thread's connection inside a write transaction"""
+        return Transaction(self.connect())
+
+
+class Transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK around a block"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
@@ -0,0 +1,106 @@
+"""Certificate output encoders (PNG, JPEG, WebP) and an encode benchmark"""
+import io
+import time
+
+from . import metrics
+
+OUTPUT_FORMATS = {
+    'PNG': {'ext': 'png', 'mime': 'image/png'},
+    'JPEG': {'ext': 'jpg', 'mime': 'image/jpeg'},
+    'WEBP': {'ext': 'webp', 'mime': 'image/webp'},
+}
+
+DEFAULT_OUTPUT_OPTIONS = {
+    'png_compress_level': 6,
+    'png_optimize': False,
+    'jpeg_quality': 90,
+    'jpeg_subsampling': '4:2:0',
+    'webp_lossless': True,
+    'webp_quality': 90,
+}
+
+JPEG_SUBSAMPLING = ['4:4:4', '4:2:2', '4:2:0']
+
+# (label, format, options) combinations reported by benchmark_encoders
+BENCHMARK_PRESETS = [
+    ("PNG level 1", 'PNG', {'png_compress_level': 1}),
+    ("PNG level 6", 'PNG', {'png_compress_level': 6}),
+    ("PNG level 9 + optimize", 'PNG', {'png_compress_level': 9, 'png_optimize': True}),
+    ("JPEG q95 4:4:4", 'JPEG', {'jpeg_quality': 95, 'jpeg_subsampling': '4:4:4'}),
+    ("JPEG q85 4:2:0", 'JPEG', {'jpeg_quality': 85, 'jpeg_subsampling': '4:2:0'}),
+    ("WebP lossless", 'WEBP', {'webp_lossless': True}),
+    ("WebP q90", 'WEBP', {'webp_lossless': False, 'webp_quality': 90}),
+    ("WebP q75", 'WEBP', {'webp_lossless': False, 'webp_quality': 75}),
+]
+
+
+def output_settings(config):
+    """Return (format, options) from a config dict, filling in defaults"""
+    output_format = config.get('output_format') or 'PNG'
+    if output_format not in OUTPUT_FORMATS:
+        output_format = 'PNG'
+    options = dict(DEFAULT_OUTPUT_OPTIONS)
+    options.update(config.get('output_options') or {})
+    return output_format, options
+
+
+def output_extension(output_format):
+    return OUTPUT_FORMATS.get(output_format, OUTPUT_FORMATS['PNG'])['ext']
+
+
+def output_mime(output_format):
+    return OUTPUT_FORMATS.get(output_format, OUTPUT_FORMATS['PNG'])['mime']
+
+
+def _flatten(img):
+    """Drop alpha for formats without it, compositing onto white"""
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        from PIL import Image
+
+        rgba = img.convert('RGBA')
+        background = Image.new('RGB', rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        return background
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+
+def encode_certificate(img, output_format='PNG', options=None):
+    """Encode a rendered certificate and return the bytes"""
+    opts = dict(DEFAULT_OUTPUT_OPTIONS)
+    opts.update(options or {})
+    buf = io.BytesIO()
+    with metrics.timed('encode', format=output_format):
+        if output_format == 'JPEG':
+            _flatten(img).save(buf, format='JPEG', quality=int(opts['jpeg_quality']),
+                               subsampling=opts['jpeg_subsampling'], optimize=True)
+        elif output_format == 'WEBP':
+            if opts['webp_lossless']:
+                img.save(buf, format='WEBP', lossless=True, quality=100, method=4)
+            else:
+                img.save(buf, format='WEBP', quality=int(opts['webp_quality']), method=4)
+        else:
+            img.save(buf, format='PNG', compress_level=int(opts['png_compress_level']),
+                     optimize=bool(opts['png_optimize']))
+    return buf.getvalue()
+
+
+def benchmark_encoders(img, repeat=3, presets=BENCHMARK_PRESETS):
+    """Time each preset on img; return rows of label/format/ms/bytes"""
+    rows = []
+    for label, output_format, options in presets:
+        best = None
+        size = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            size = len(encode_certificate(img, output_format, options))
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        rows.append({
+            'preset': label,
+            'format': output_format,
+            'encode_ms': round(best * 1000, 1),
+            'bytes': size,
+        })
+    return rows
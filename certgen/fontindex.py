@@ -0,0 +1,189 @@
+"""Persistent index of installed and uploaded fonts.
+
+The standard font directories (plus FONT_UPLOAD_DIR) are scanned once and
+every font's family and style are read from its name table. The result maps
+(family, weight, italic) to a file and is saved to FONT_INDEX_PATH; on the
+next start it is reused as long as no scanned directory has changed mtime,
+and only new or modified files are re-read when one has.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+
+from PIL import ImageFont
+
+logger = logging.getLogger(__name__)
+
+FONT_INDEX_PATH = '.font_index.json'
+FONT_UPLOAD_DIR = 'fonts'
+FONT_EXTENSIONS = ('.ttf', '.otf', '.ttc')
+INDEX_VERSION = 1
+
+
+def default_font_dirs():
+    """Platform font directories, followed by the upload directory"""
+    dirs = ['/usr/share/fonts', '/usr/local/share/fonts',
+            os.path.expanduser('~/.fonts'), os.path.expanduser('~/.local/share/fonts')]
+    if sys.platform == 'darwin':
+        dirs += ['/System/Library/Fonts', '/Library/Fonts',
+                 os.path.expanduser('~/Library/Fonts')]
+    elif os.name == 'nt':
+        dirs.append(os.path.join(os.environ.get('WINDIR', r'C:\Windows'), 'Fonts'))
+    dirs.append(FONT_UPLOAD_DIR)
+    return dirs
+
+
+def parse_style(style):
+    """Return (weight, italic) for a name-table style such as 'Bold Oblique'"""
+    words = style.lower()
+    weight = 'Bold' if any(w in words for w in ('bold', 'black', 'heavy')) else 'Regular'
+    italic = 'italic' in words or 'oblique' in words
+    return weight, italic
+
+
+def _style_rank(style, weight, italic):
+    """Lower is a better match for the plain (weight, italic) face"""
+    plain = {('Regular', False): ('regular', 'book', 'normal', 'roman'),
+             ('Bold', False): ('bold',),
+             ('Regular', True): ('italic', 'oblique'),
+             ('Bold', True): ('bold italic', 'bold oblique')}[(weight, italic)]
+    style = style.lower()
+    return (0 if style in plain else 1, len(style))
+
+
+class FontIndex:
+    """Maps (family, weight, italic) to font files found on disk"""
+
+    def __init__(self, path=FONT_INDEX_PATH, dirs=None):
+        self.path = path
+        self.dirs = list(dirs) if dirs is not None else default_font_dirs()
+        self._lock = threading.Lock()
+        self._files = {}
+        self._dir_mtimes = {}
+        self._faces = {}
+        self.rescans = 0
+
+    def _walk_dirs(self):
+        mtimes = {}
+        for top in self.dirs:
+            for root, _, _ in os.walk(top):
+                try:
+                    mtimes[root] = os.stat(root).st_mtime_ns
+                except OSError:
+                    continue
+        return mtimes
+
+    def _read_saved(self):
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        if saved.get('version') == INDEX_VERSION and saved.get('font_dirs') == self.dirs:
+            self._files = saved.get('files', {})
+            self._dir_mtimes = saved.get('dirs', {})
+
+    def _write(self):
+        data = {'version': INDEX_VERSION, 'font_dirs': self.dirs,
+                'dirs': self._dir_mtimes, 'files': self._files}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("Could not save font index: %s", e)
+
+    def _scan(self, dir_mtimes):
+        files = {}
+        for root in dir_mtimes:
+            try:
+                entries = os.listdir(root)
+            except OSError:
+                continue
+            for filename in entries:
+                if not filename.lower().endswith(FONT_EXTENSIONS):
+                    continue
+                path = os.path.join(root, filename)
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                except OSError:
+                    continue
+                entry = self._files.get(path)
+                if entry is None or entry['mtime'] != mtime:
+                    entry = self._read_font(path, mtime)
+                if entry is not None:
+                    files[path] = entry
+        return files
+
+    @staticmethod
+    def _read_font(path, mtime):
+        try:
+            family, style = ImageFont.truetype(path, 12).getname()
+        except Exception:
+            return None
+        if not family:
+            return None
+        return {'mtime': mtime, 'family': family, 'style': style or 'Regular'}
+
+    def _build_faces(self):
+        faces = {}
+        for path, entry in sorted(self._files.items()):
+            weight, italic = parse_style(entry['style'])
+            key = (entry['family'].casefold(), weight, italic)
+            rank = _style_rank(entry['style'], weight, italic)
+            current = faces.get(key)
+            if current is None or rank < current[0]:
+                faces[key] = (rank, path, entry['family'])
+        self._faces = {key: (path, family) for key, (_, path, family) in faces.items()}
+
+    def load(self):
+        """Load the saved index, rescanning only if a font directory changed"""
+        with self._lock:
+            if not self._files:
+                self._read_saved()
+            dir_mtimes = self._walk_dirs()
+            if dir_mtimes != self._dir_mtimes or not self._faces:
+                if dir_mtimes != self._dir_mtimes:
+                    self._files = self._scan(dir_mtimes)
+                    self._dir_mtimes = dir_mtimes
+                    self.rescans += 1
+                    self._write()
+                self._build_faces()
+        return self
+
+    def refresh(self):
+        """Pick up fonts added since the last load, e.g. after an upload"""
+        return self.load()
+
+    def lookup(self, family, weight='Regular', italic=False):
+        """Path of the best face for family, falling back to its other styles"""
+        family = family.casefold()
+        for key in ((family, weight, italic), (family, 'Regular', italic),
+                    (family, weight, False), (family, 'Regular', False)):
+            face = self._faces.get(key)
+            if face is not None:
+                return face[0]
+        return None
+
+    def families(self):
+        """Sorted display names of every indexed family"""
+        return sorted({family for _, family in self._faces.values()}, key=str.casefold)
+
+    def __len__(self):
+        return len(self._files)
+
+
+_font_index = None
+_font_index_lock = threading.Lock()
+
+
+def get_font_index():
+    """Return the process-wide FontIndex, loading it on first use"""
+    global _font_index
+    with _font_index_lock:
+        if _font_index is None:
+            _font_index = FontIndex().load()
+        return _font_index
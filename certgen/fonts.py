@@ -0,0 +1,211 @@
+"""Font resolution through the font index, with a process-wide LRU cache"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import ImageFont
+
+from . import metrics
+from .fontindex import get_font_index
+
+logger = logging.getLogger(__name__)
+
+# Families offered under their familiar names, with metric-compatible stand-ins
+FAMILY_ALIASES = {
+    'Arial': ('Arial', 'Liberation Sans', 'Arimo'),
+    'Times New Roman': ('Times New Roman', 'Liberation Serif', 'Tinos'),
+    'Courier New': ('Courier New', 'Liberation Mono', 'Cousine'),
+}
+
+# Indexed families tried when the requested one is not installed
+FALLBACK_FAMILIES = ('DejaVu Sans', 'Liberation Sans', 'Arial', 'Helvetica', 'Noto Sans')
+
+# Legacy file names, only probed when the font index has no usable match
+FONT_FAMILIES = {
+    'Arial': {
+        'Regular': ['arial.ttf', 'Arial.ttf', '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf'],
+        'Bold': ['arialbd.ttf', 'Arial-Bold.ttf', '/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf'],
+        'Italic': ['ariali.ttf', 'Arial-Italic.ttf', '/usr/share/fonts/truetype/liberation/LiberationSans-Italic.ttf'],
+        'Bold Italic': ['arialbi.ttf', 'Arial-BoldItalic.ttf', '/usr/share/fonts/truetype/liberation/LiberationSans-BoldItalic.ttf']
+    },
+    'Times New Roman': {
+        'Regular': ['times.ttf', 'Times-New-Roman.ttf', '/usr/share/fonts/truetype/liberation/LiberationSerif-Regular.ttf'],
+        'Bold': ['timesbd.ttf', 'Times-New-Roman-Bold.ttf', '/usr/share/fonts/truetype/liberation/LiberationSerif-Bold.ttf'],
+        'Italic': ['timesi.ttf', 'Times-New-Roman-Italic.ttf', '/usr/share/fonts/truetype/liberation/LiberationSerif-Italic.ttf'],
+        'Bold Italic': ['timesbi.ttf', 'Times-New-Roman-BoldItalic.ttf', '/usr/share/fonts/truetype/liberation/LiberationSerif-BoldItalic.ttf']
+    },
+    'Courier New': {
+        'Regular': ['cour.ttf', 'Courier-New.ttf', '/usr/share/fonts/truetype/liberation/LiberationMono-Regular.ttf'],
+        'Bold': ['courbd.ttf', 'Courier-New-Bold.ttf', '/usr/share/fonts/truetype/liberation/LiberationMono-Bold.ttf'],
+        'Italic': ['couri.ttf', 'Courier-New-Italic.ttf', '/usr/share/fonts/truetype/liberation/LiberationMono-Italic.ttf'],
+        'Bold Italic': ['courbi.ttf', 'Courier-New-BoldItalic.ttf', '/usr/share/fonts/truetype/liberation/LiberationMono-BoldItalic.ttf']
+    }
+}
+
+
+FALLBACK_FONTS = [
+    "arial.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+    "/System/Library/Fonts/Helvetica.ttc",
+    "/Library/Fonts/Arial.ttf",
+]
+
+
+class FontCache:
+    """Process-wide LRU cache of loaded fonts, shared by every session.
+
+    Fonts are keyed on (resolved path, size, variant). Paths that fail to
+    load are remembered so the fallback chain is not re-probed on every rerun.
+    """
+
+    def __init__(self, max_fonts=64):
+        self.max_fonts = max_fonts
+        self._fonts = OrderedDict()
+        self._failed = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _resolve(path):
+        """Return an absolute path plus mtime for real files, so a re-uploaded
+        font under the same name is not served stale."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return path, None
+        return os.path.abspath(path), stat.st_mtime_ns
+
+    def load(self, path, size, variant=""):
+        """Return a FreeTypeFont for path/size, or None if it cannot be loaded"""
+        resolved = self._resolve(path)
+        key = (resolved, int(size), variant)
+        with self._lock:
+            font = self._fonts.get(key)
+            if font is not None:
+                self._fonts.move_to_end(key)
+                self.hits += 1
+                return font
+            if resolved in self._failed:
+                self.hits += 1
+                return None
+            self.misses += 1
+
+        try:
+            font = ImageFont.truetype(path, int(size))
+        except Exception as e:
+            with self._lock:
+                self._failed[resolved] = str(e)
+            return None
+
+        with self._lock:
+            self._fonts[key] = font
+            self._fonts.move_to_end(key)
+            while len(self._fonts) > self.max_fonts:
+                self._fonts.popitem(last=False)
+                self.evictions += 1
+        return font
+
+    def error_for(self, path):
+        """Return the load error recorded for path, if any"""
+        return self._failed.get(self._resolve(path))
+
+    def clear(self):
+        with self._lock:
+            self._fonts.clear()
+            self._failed.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'cached_fonts': len(self._fonts),
+                'failed_paths': len(self._failed),
+            }
+
+
+# One cache per process; every Streamlit session (and every pool worker) reuses it
+_font_cache = FontCache()
+
+
+def _font_cache_metrics():
+    stats = _font_cache.stats()
+    yield 'certgen_font_cache_hits_total', {}, stats['hits']
+    yield 'certgen_font_cache_misses_total', {}, stats['misses']
+    yield 'certgen_font_cache_evictions_total', {}, stats['evictions']
+
+
+metrics.registry.add_collector(_font_cache_metrics)
+
+
+def get_font_cache():
+    """Return the process-wide FontCache"""
+    return _font_cache
+
+
+def _style_key(font_weight, is_italic):
+    if not is_italic:
+        return font_weight
+    return 'Bold Italic' if font_weight == 'Bold' else 'Italic'
+
+
+def find_font_path(font_family='Arial', font_weight='Regular', is_italic=False):
+    """Look up the file for a family and style in the font index, or None"""
+    index = get_font_index()
+    for family in FAMILY_ALIASES.get(font_family, (font_family,)) + FALLBACK_FAMILIES:
+        path = index.lookup(family, font_weight, is_italic)
+        if path is not None:
+            return path
+    return None
+
+
+def available_families():
+    """Font families that can actually be rendered, for the family picker"""
+    index = get_font_index()
+    families = [alias for alias, names in FAMILY_ALIASES.items()
+                if any(index.lookup(name) for name in names)]
+    seen = {family.casefold() for family in families}
+    for family in index.families():
+        if family.casefold() not in seen:
+            seen.add(family.casefold())
+            families.append(family)
+    return families
+
+
+def resolve_font(font_size, font_family='Arial', font_weight='Regular',
+                 is_italic=False, custom_font_path=None):
+    """Resolve custom font -> indexed family -> legacy paths -> default"""
+    cache = get_font_cache()
+
+    # 1. Try custom font first
+    if custom_font_path and os.path.exists(custom_font_path):
+        font = cache.load(custom_font_path, font_size, 'Custom')
+        if font is not None:
+            return font
+        logger.warning("Failed to load custom font: %s", cache.error_for(custom_font_path))
+
+    # 2. Selected family and style from the font index: a dictionary lookup
+    style_key = _style_key(font_weight, is_italic)
+    font_path = find_font_path(font_family, font_weight, is_italic)
+    if font_path is not None:
+        font = cache.load(font_path, font_size, style_key)
+        if font is not None:
+            return font
+
+    # 3. Nothing indexed (e.g. fonts only reachable by bare name on Windows)
+    family_config = FONT_FAMILIES.get(font_family, FONT_FAMILIES['Arial'])
+    for path in family_config.get(style_key, family_config['Regular']):
+        font = cache.load(path, font_size, style_key)
+        if font is not None:
+            return font
+    for fallback in FALLBACK_FONTS:
+        font = cache.load(fallback, font_size, 'Fallback')
+        if font is not None:
+            return font
+
+    return ImageFont.load_default()
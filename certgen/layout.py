@@ -0,0 +1,189 @@
+"""Extra certificate fields and the baked static layer.
+
+Besides the name, a layout holds a list of fields saved in the config:
+
+- text: ``{'type': 'text', 'text', 'x', 'y', 'font_size', 'font_family',
+  'font_weight', 'is_italic', 'color', 'align'}``
+- image: ``{'type': 'image', 'path', 'x', 'y', 'width', 'align'}``
+- qr: ``{'type': 'qr', 'x', 'y', 'size', 'color', 'align', 'verify_url'}``, the
+  certificate ID (or a verification link to it) as a QR code
+
+``x`` is the anchor given by ``align`` (left, center or right) and ``y`` the
+top edge. QR codes and text containing a placeholder such as ``{name}`` or
+``{certificate_id}`` are drawn per person; everything else is composited
+once into a baked copy of the template, so extra static fields add nothing
+to the per-certificate cost.
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+from PIL import Image, ImageDraw
+
+from .render import _draw_name, _layout_field, is_dynamic_field, scale_field
+from .templates import TEMPLATE_DIR, load_template, save_info
+
+BAKED_PREFIX = 'baked-'
+# Bumped when baked files change format, so older bakes are not reused
+BAKE_VERSION = 2
+# Baked files unused for this long may be pruned; newer ones can still be in use
+# by pool workers or other server processes
+BAKED_GRACE_SECONDS = 3600
+
+_file_hashes = {}
+_file_hashes_lock = threading.Lock()
+
+
+def text_field(text, x, y, font_size=32, color=(0, 0, 0), font_family='Arial',
+               font_weight='Regular', is_italic=False, align='center'):
+    return {'type': 'text', 'text': text, 'x': int(x), 'y': int(y),
+            'font_size': int(font_size), 'color': tuple(color), 'font_family': font_family,
+            'font_weight': font_weight, 'is_italic': bool(is_italic), 'align': align}
+
+
+def image_field(path, x, y, width, align='center'):
+    return {'type': 'image', 'path': path, 'x': int(x), 'y': int(y), 'width': int(width),
+            'align': align}
+
+
+def qr_field(x, y, size=160, color=(0, 0, 0), align='center', verify_url=''):
+    return {'type': 'qr', 'x': int(x), 'y': int(y), 'size': int(size), 'color': tuple(color),
+            'align': align, 'verify_url': verify_url}
+
+
+def save_field_image(data, directory=TEMPLATE_DIR):
+    """Store an uploaded field image as RGBA PNG named by its hash; return the path"""
+    with Image.open(io.BytesIO(data)) as upload:
+        img = upload.convert('RGBA')
+    buf = io.BytesIO()
+    img.save(buf, format='PNG', compress_level=6)
+    png = buf.getvalue()
+    path = os.path.join(directory, f"field-{hashlib.sha256(png).hexdigest()[:16]}.png")
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        with open(f"{path}.tmp", 'wb') as f:
+            f.write(png)
+        os.replace(f"{path}.tmp", path)
+    return path
+
+
+def static_fields(fields):
+    return [field for field in fields or () if not is_dynamic_field(field)]
+
+
+def _file_sha256(path):
+    """Content hash of path, memoised per (path, mtime, size)"""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    with _file_hashes_lock:
+        digest = _file_hashes.get(key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with _file_hashes_lock:
+            _file_hashes[key] = digest
+    return digest
+
+
+def _bake_key(template_path, fields, scale):
+    parts = [str(BAKE_VERSION), _file_sha256(template_path), repr(scale)]
+    for field in fields:
+        field = dict(field)
+        if field.get('type') == 'image':
+            try:
+                field['sha256'] = _file_sha256(field['path'])
+            except OSError:
+                field['sha256'] = None
+        parts.append(json.dumps(field, sort_keys=True, default=list))
+    return hashlib.sha256('\0'.join(parts).encode()).hexdigest()
+
+
+def _paste_image_field(img, field):
+    with Image.open(field['path']) as source:
+        overlay = source.convert('RGBA')
+    width = int(field.get('width') or overlay.width)
+    height = max(1, round(overlay.height * width / overlay.width))
+    overlay = overlay.resize((width, height), Image.Resampling.LANCZOS)
+    left = int(field.get('x', 0))
+    align = field.get('align', 'center')
+    if align != 'left':
+        left -= width // 2 if align == 'center' else width
+    img.paste(overlay, (left, int(field.get('y', 0))), overlay)
+
+
+def bake_template(template_path, fields, scale=1.0, directory=TEMPLATE_DIR):
+    """Path of template_path with every static field composited in.
+
+    Baked images are named by a hash of the template, the fields and any
+    field images, so this is a cheap lookup after the first call. With no
+    static fields the template itself is returned. ``scale`` resizes field
+    coordinates for a smaller template variant.
+    """
+    fields = static_fields(fields)
+    if not fields:
+        return template_path
+    if scale != 1.0:
+        fields = [scale_field(field, scale) for field in fields]
+    key = _bake_key(template_path, fields, scale)
+    baked_path = os.path.join(directory, f"{BAKED_PREFIX}{key[:16]}.png")
+    if os.path.exists(baked_path):
+        try:
+            # The mtime records last use, which is what prune_baked goes by
+            os.utime(baked_path)
+        except OSError:
+            pass
+        return baked_path
+
+    img = load_template(template_path)
+    draw = ImageDraw.Draw(img)
+    for field in fields:
+        if field.get('type') == 'image':
+            try:
+                _paste_image_field(img, field)
+            except OSError:
+                continue
+        else:
+            text = field.get('text', '')
+            _draw_name(draw, text, _layout_field(field, text, draw))
+
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{baked_path}.{os.getpid()}.tmp"
+    img.save(tmp_path, format='PNG', compress_level=6, **save_info(img))
+    os.replace(tmp_path, baked_path)
+    return baked_path
+
+
+def render_template_path(config):
+    """Template to render certificates on: the baked one when there are static fields"""
+    template_path = config.get('template_path')
+    if not template_path or not os.path.exists(template_path):
+        return template_path
+    return bake_template(template_path, config.get('fields'))
+
+
+def prune_baked(keep=(), directory=TEMPLATE_DIR, grace=BAKED_GRACE_SECONDS):
+    """Delete baked templates not in keep and unused for grace seconds; return how many"""
+    keep = {os.path.abspath(path) for path in keep if path}
+    cutoff = time.time() - grace
+    removed = 0
+    try:
+        filenames = os.listdir(directory)
+    except OSError:
+        return 0
+    for filename in filenames:
+        path = os.path.join(directory, filename)
+        if not filename.startswith(BAKED_PREFIX) or os.path.abspath(path) in keep:
+            continue
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
@@ -0,0 +1,85 @@
+"""Forgiving participant lookup backed by a trigram index.
+
+Names are compared in a normalised form (NFC, casefolded, whitespace
+collapsed), so "john  doe" finds "John Doe" directly. For anything else
+the index suggests close names: candidates come from the rarest trigrams
+of the query only, so a lookup touches a bounded slice of the roster
+rather than scanning it, and only those candidates are scored.
+"""
+import unicodedata
+from collections import Counter
+from itertools import chain
+
+# Posting entries gathered per query before candidates are ranked
+CANDIDATE_BUDGET = 1500
+# Candidates scored exactly after the posting-count pass
+SCORED_CANDIDATES = 32
+# Minimum Dice similarity of trigram sets for a suggestion
+MIN_SIMILARITY = 0.35
+
+
+def normalize_lookup(name):
+    """Comparison form of a name: NFC, casefolded, single spaces, trimmed"""
+    return ' '.join(unicodedata.normalize('NFC', name).casefold().split())
+
+
+def trigrams(normalized):
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """Normalised exact lookup plus trigram suggestions over a fixed roster"""
+
+    def __init__(self, names):
+        self.names = []
+        self._exact = {}
+        self._grams = []
+        postings = {}
+        for name in names:
+            key = normalize_lookup(name)
+            if not key:
+                continue
+            name_id = len(self.names)
+            self.names.append(name)
+            self._exact.setdefault(key, []).append(name_id)
+            grams = trigrams(key)
+            self._grams.append(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(name_id)
+        self._postings = postings
+
+    def __len__(self):
+        return len(self.names)
+
+    def find(self, query):
+        """Registered names equal to query once normalised (usually zero or one)"""
+        return [self.names[i] for i in self._exact.get(normalize_lookup(query), ())]
+
+    def suggest(self, query, limit=5):
+        """Up to limit registered names most similar to query, best first"""
+        key = normalize_lookup(query)
+        if not key:
+            return []
+        query_grams = trigrams(key)
+        lists = sorted((self._postings[g] for g in query_grams if g in self._postings), key=len)
+        if not lists:
+            return []
+
+        # Rare trigrams discriminate best; stop once the budget is spent
+        selected, gathered = [], 0
+        for postings in lists:
+            if selected and gathered + len(postings) > CANDIDATE_BUDGET:
+                break
+            selected.append(postings)
+            gathered += len(postings)
+        candidates = Counter(chain.from_iterable(selected)).most_common(SCORED_CANDIDATES)
+
+        scored = []
+        for name_id, _ in candidates:
+            grams = self._grams[name_id]
+            similarity = 2 * len(query_grams & grams) / (len(query_grams) + len(grams))
+            if similarity >= MIN_SIMILARITY:
+                scored.append((-similarity, self.names[name_id]))
+        scored.sort()
+        return [name for _, name in scored[:limit]]
@@ -0,0 +1,301 @@
+"""Per-stage timing histograms, counters and a Prometheus text export.
+
+Metrics are off unless ``CERTGEN_METRICS=1`` (or ``set_enabled(True)``);
+while off, ``timed()`` hands back a shared no-op context manager and
+``inc()`` returns after a single flag check. Exposition options:
+
+- ``CERTGEN_METRICS_PORT``: serve ``/metrics`` on 127.0.0.1 from a thread
+- ``CERTGEN_METRICS_FILE``: rewrite a Prometheus text file every 15 s
+- ``CERTGEN_METRICS_LOG=1``: one JSON log line per request on the
+  ``certgen.requests`` logger
+
+Metrics are per process. Renderer pool workers capture their stage timings
+and send them back with each result, so the serving process exports them;
+bulk and warm-up workers keep their own, which are not exported.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+STAGE_METRIC = 'certgen_stage_duration_seconds'
+REQUEST_METRIC = 'certgen_request_duration_seconds'
+
+# Upper bounds in seconds, from sub-millisecond cache hits to slow full renders
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+request_log = logging.getLogger('certgen.requests')
+
+_enabled = os.environ.get('CERTGEN_METRICS', '') not in ('', '0')
+_log_requests = os.environ.get('CERTGEN_METRICS_LOG', '') not in ('', '0')
+
+
+def enabled():
+    return _enabled
+
+
+def set_enabled(value=True, log_requests=None):
+    """Turn collection (and optionally per-request log lines) on or off"""
+    global _enabled, _log_requests
+    _enabled = bool(value)
+    if log_requests is not None:
+        _log_requests = bool(log_requests)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Registry:
+    """Holds histograms, counters and collector callbacks for export"""
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def histogram(self, name, labels):
+        key = (name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram())
+        return histogram
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def add_collector(self, collector):
+        """Register collector() -> iterable of (name, labels dict, value) counters"""
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            collectors = list(self._collectors)
+
+        seen_types = set()
+        for (name, labels), histogram in histograms:
+            if name not in seen_types:
+                lines.append(f"# TYPE {name} histogram")
+                seen_types.add(name)
+            with histogram._lock:
+                counts = list(histogram.counts)
+                total, count = histogram.sum, histogram.count
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+
+        collected = [(name, tuple(sorted(labels.items())), value)
+                     for collector in collectors for name, labels, value in collector()]
+        for name, labels, value in sorted(_counter_rows(counters) + collected):
+            if name not in seen_types:
+                lines.append(f"# TYPE {name} counter")
+                seen_types.add(name)
+            lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _counter_rows(counters):
+    return [(name, labels, value) for (name, labels), value in counters]
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels:
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{escaped}"')
+    return '{' + ','.join(parts) + '}'
+
+
+registry = Registry()
+
+# Per-thread list that observations go to instead of the registry, see capture()
+_capture = threading.local()
+
+
+def _record(metric, labels, seconds):
+    observations = getattr(_capture, 'observations', None)
+    if observations is not None:
+        observations.append((metric, labels, seconds))
+    else:
+        registry.histogram(metric, labels).observe(seconds)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('metric', 'labels', 'start', 'elapsed')
+
+    def __init__(self, metric, labels):
+        self.metric = metric
+        self.labels = labels
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+        _record(self.metric, self.labels, self.elapsed)
+        return False
+
+
+def timed(stage, metric=STAGE_METRIC, **labels):
+    """Context manager timing one stage into a histogram (no-op when disabled)"""
+    if not _enabled:
+        return _NULL_TIMER
+    key = (('stage', stage),) + tuple(sorted(labels.items()))
+    return _Timer(metric, key)
+
+
+def observe(metric, seconds, **labels):
+    if _enabled:
+        _record(metric, tuple(sorted(labels.items())), seconds)
+
+
+@contextmanager
+def capture():
+    """Collect this thread's timings into a list instead of the registry.
+
+    For worker processes, whose registry is never exported: the list is
+    picklable, goes back with the result and is replayed by the parent.
+    """
+    observations = []
+    previous = getattr(_capture, 'observations', None)
+    _capture.observations = observations
+    try:
+        yield observations
+    finally:
+        _capture.observations = previous
+
+
+def replay(observations):
+    """Record timings captured in another process"""
+    if _enabled:
+        for metric, labels, seconds in observations:
+            registry.histogram(metric, labels).observe(seconds)
+
+
+def inc(metric, value=1, **labels):
+    if _enabled:
+        registry.inc(metric, tuple(sorted(labels.items())), value)
+
+
+def log_request(event, **fields):
+    """Emit one structured JSON line for a request, if request logging is on"""
+    if _log_requests:
+        request_log.info(json.dumps({'event': event, 'ts': round(time.time(), 3), **fields},
+                                    default=str))
+
+
+def render_prometheus():
+    return registry.render()
+
+
+def write_prometheus(path):
+    """Atomically write the current metrics to path (textfile-collector style)"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(render_prometheus())
+    os.replace(tmp_path, path)
+
+
+def start_http_server(port, host='127.0.0.1'):
+    """Serve /metrics from a daemon thread; returns the server"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = render_prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='certgen-metrics', daemon=True).start()
+    return server
+
+
+def _file_writer(path, interval):
+    while True:
+        try:
+            write_prometheus(path)
+        except OSError:
+            pass
+        time.sleep(interval)
+
+
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+
+def start_from_env():
+    """Start the exporters configured by environment variables, once per process"""
+    global _exporters_started
+    with _exporters_lock:
+        if _exporters_started or not _enabled:
+            return
+        _exporters_started = True
+        port = os.environ.get('CERTGEN_METRICS_PORT')
+        if port:
+            try:
+                start_http_server(int(port))
+            except OSError as e:
+                logging.getLogger(__name__).warning("metrics server not started: %s", e)
+        path = os.environ.get('CERTGEN_METRICS_FILE')
+        if path:
+            threading.Thread(target=_file_writer, args=(path, 15.0),
+                             name='certgen-metrics-file', daemon=True).start()
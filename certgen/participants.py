@@ -0,0 +1,100 @@
+"""Participant roster with hash-indexed membership"""
+import threading
+from itertools import islice
+
+
+class ParticipantStore:
+    """Insertion-ordered participant roster.
+
+    Backed by a dict used as an ordered set, so membership checks, adds and
+    removals are O(1) while iteration keeps the order names were added in.
+    A frozen store is safe to share between sessions and rejects changes.
+    """
+
+    def __init__(self, names=(), frozen=False):
+        self._names = dict.fromkeys(names)
+        self.frozen = frozen
+        self._name_index = None
+        self._name_index_lock = threading.Lock()
+
+    def _check_mutable(self):
+        if self.frozen:
+            raise TypeError("this participant list is a read-only snapshot")
+        self._name_index = None
+
+    def name_index(self):
+        """NameIndex for fuzzy lookup, built once per version of the roster.
+
+        Shared snapshots are used by every session at once, so the build
+        happens under a lock: concurrent callers wait for the first one's
+        index rather than each building their own.
+        """
+        index = self._name_index
+        if index is None:
+            from .lookup import NameIndex
+
+            with self._name_index_lock:
+                index = self._name_index
+                if index is None:
+                    index = self._name_index = NameIndex(self._names)
+        return index
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __repr__(self):
+        return f"ParticipantStore({len(self)} names)"
+
+    def add(self, name):
+        """Add name; return False if it was already registered"""
+        self._check_mutable()
+        if name in self._names:
+            return False
+        self._names[name] = None
+        return True
+
+    def add_many(self, names):
+        """Add every new name in names; return how many were added"""
+        self._check_mutable()
+        before = len(self._names)
+        for name in names:
+            self._names.setdefault(name, None)
+        return len(self._names) - before
+
+    def remove(self, name):
+        """Remove name; return False if it was not registered"""
+        self._check_mutable()
+        try:
+            del self._names[name]
+        except KeyError:
+            return False
+        return True
+
+    def to_list(self):
+        return list(self._names)
+
+    def count(self, query=''):
+        """Number of names matching query (all names without one)"""
+        if not query:
+            return len(self._names)
+        needle = query.casefold()
+        return sum(1 for name in self._names if needle in name.casefold())
+
+    def page(self, page, page_size, query=''):
+        """Return (names on page, total matching) for a 0-based page index.
+
+        With a query, names are filtered by case-insensitive substring.
+        """
+        if query:
+            needle = query.casefold()
+            matches = [name for name in self._names if needle in name.casefold()]
+            start = page * page_size
+            return matches[start:start + page_size], len(matches)
+        start = page * page_size
+        return list(islice(self._names, start, start + page_size)), len(self._names)
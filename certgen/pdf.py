@@ -0,0 +1,127 @@
+"""Vector PDF output: the template is embedded once and names are real text.
+
+Requires the optional ``fpdf2`` package, which subsets embedded TrueType
+fonts and stores an image referenced from several pages only once.
+"""
+from .render import _layout_dynamic, _layout_name, normalize_color
+from .verify import certificate_id, verification_payload
+
+# Used to size pages when the template carries no DPI metadata
+DEFAULT_PDF_DPI = 150
+
+
+def pdf_available():
+    """True if the optional fpdf2 dependency is installed"""
+    import importlib.util
+
+    return importlib.util.find_spec('fpdf') is not None
+
+
+def _fpdf():
+    try:
+        import fpdf
+    except ImportError:
+        raise RuntimeError("PDF output requires the 'fpdf2' package (pip install fpdf2)") from None
+    return fpdf
+
+
+def _template_dpi(template_img):
+    dpi = template_img.info.get('dpi')
+    if dpi and dpi[0]:
+        return float(dpi[0])
+    return float(DEFAULT_PDF_DPI)
+
+
+def render_pdf(names, template_path, template_img, x, y, font_size, color,
+               font_family='Arial', font_weight='Regular', is_italic=False,
+               custom_font_path=None, stroke_width=0, stroke_color=(0, 0, 0),
+               max_width=None, max_height=None, fields=(), id_version=None):
+    """Render one page per name into a single PDF and return its bytes.
+
+    Layout arguments match generate_certificate, and the name and any
+    per-person fields are placed exactly where the raster renderer would
+    draw them. ``template_path`` is what gets embedded (the baked template
+    when there are static fields), so every page references one image. QR
+    codes are drawn as vector modules.
+    """
+    fpdf = _fpdf()
+
+    scale = 72.0 / _template_dpi(template_img)
+    width_px, height_px = template_img.size
+    stroke_color = normalize_color(stroke_color)
+    stroke_width = int(stroke_width)
+
+    pdf = fpdf.FPDF(unit='pt', format=(width_px * scale, height_px * scale))
+    pdf.set_auto_page_break(False)
+    pdf.set_margin(0)
+    font_names = {}
+
+    def set_font(font):
+        font_path = getattr(font, 'path', None)
+        if not isinstance(font_path, str):
+            raise RuntimeError("PDF output needs a TrueType font; none of the configured "
+                               "fonts could be loaded")
+        if font_path not in font_names:
+            font_names[font_path] = f"certificate{len(font_names)}"
+            pdf.add_font(font_names[font_path], fname=font_path)
+        pdf.set_font(font_names[font_path], size=font.size * scale)
+
+    for name in names:
+        # Same layout as the raster renderer, including any auto-fit size
+        layout = _layout_name(name, x, y, font_size, color, font_family, font_weight, is_italic,
+                              custom_font_path, stroke_width, stroke_color,
+                              max_width=max_width, max_height=max_height)
+        set_font(layout['font'])
+
+        pdf.add_page()
+        pdf.image(template_path, x=0, y=0, w=width_px * scale, h=height_px * scale)
+
+        # Pillow anchors text at the ascender line; PDF text sits on the baseline
+        left = layout['xy'][0] * scale
+        baseline = (layout['xy'][1] + layout['font'].getmetrics()[0]) * scale
+
+        if stroke_width > 0:
+            # Pillow strokes outside the glyph and fills on top; PDF strokes are
+            # centred on the outline, so draw a double-width stroke then refill
+            pdf.set_draw_color(*stroke_color[:3])
+            pdf.set_line_width(2 * stroke_width * scale)
+            pdf.text_mode = fpdf.enums.TextMode.STROKE
+            pdf.text(left, baseline, name)
+            pdf.text_mode = fpdf.enums.TextMode.FILL
+        pdf.set_text_color(*layout['fill'][:3])
+        pdf.text(left, baseline, name)
+
+        cert_id = certificate_id(name, id_version) if id_version else ''
+        for field in fields:
+            text, field_layout = _layout_dynamic(field, name, cert_id)
+            if text is None:
+                _draw_qr(pdf, field, field_layout, verification_payload(
+                    cert_id, field.get('verify_url')), scale)
+                continue
+            set_font(field_layout['font'])
+            pdf.set_text_color(*field_layout['fill'][:3])
+            pdf.text(field_layout['xy'][0] * scale,
+                     (field_layout['xy'][1] + field_layout['font'].getmetrics()[0]) * scale, text)
+
+    return bytes(pdf.output())
+
+
+def _draw_qr(pdf, field, layout, payload, scale):
+    """Draw a QR code as filled rectangles, one per run of dark modules"""
+    from .qr import module_size, qr_matrix
+
+    matrix = qr_matrix(payload)
+    module = module_size(matrix, int(field.get('size', 160))) * scale
+    left, top = layout['xy'][0] * scale, layout['xy'][1] * scale
+    pdf.set_fill_color(255, 255, 255)
+    pdf.rect(left, top, len(matrix) * module, len(matrix) * module, style='F')
+    pdf.set_fill_color(*normalize_color(field.get('color', (0, 0, 0)))[:3])
+    for row, modules in enumerate(matrix):
+        start = None
+        for col, dark in enumerate(modules + (False,)):
+            if dark and start is None:
+                start = col
+            elif not dark and start is not None:
+                pdf.rect(left + start * module, top + row * module,
+                         (col - start) * module, module, style='F')
+                start = None
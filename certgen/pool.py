@@ -0,0 +1,283 @@
+"""Renderer process pool shared by every session in a server process.
+
+Pillow text drawing and PNG encoding hold the GIL for long stretches, so
+rendering inline in a Streamlit script thread stalls every other session.
+Live renders are instead sent to one shared process pool. The pool admits
+at most ``workers + max_queue`` jobs; beyond that ``render()`` raises
+RendererBusy straight away (with a retry hint) instead of piling up work.
+
+Settings come from the environment:
+
+- ``CERTGEN_POOL_WORKERS``: worker processes (default: CPU count, ``0``
+  renders inline in the calling thread)
+- ``CERTGEN_POOL_QUEUE``: jobs allowed to wait for a worker (default 2x workers)
+- ``CERTGEN_POOL_TIMEOUT``: seconds a caller waits for its job (default 30)
+
+Workers are started with forkserver (spawn where that is unavailable),
+never plain fork: pools are created lazily from threaded servers, and a
+forked child can inherit a lock another thread holds and hang forever.
+"""
+import math
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import types
+from collections import OrderedDict
+from concurrent import futures
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from multiprocessing import context as mp_context
+
+from . import metrics
+from .templates import load_template
+
+DEFAULT_TIMEOUT = 30.0
+
+# Decoded templates kept per worker, keyed by content hash
+WORKER_TEMPLATES = 2
+
+_worker_templates = OrderedDict()
+
+
+class RendererBusy(RuntimeError):
+    """The render queue is full; retry after ``retry_after`` seconds"""
+
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__(f"Renderer busy, retry in {retry_after} s")
+
+
+# Stands in for __main__ while a worker is started, see _main_hidden()
+_worker_main = types.ModuleType('__main__')
+
+
+@contextmanager
+def _main_hidden():
+    """Hide the parent's main script from the start-up data sent to a new worker.
+
+    Spawned and forkserver children re-run __main__, which under Streamlit
+    is the app script. Workers only need certgen, so they get an empty
+    module instead.
+    """
+    main = sys.modules.get('__main__')
+    sys.modules['__main__'] = _worker_main
+    try:
+        yield
+    finally:
+        # Streamlit may have installed a new script module meanwhile; keep that one
+        if sys.modules.get('__main__') is _worker_main:
+            sys.modules['__main__'] = main
+
+
+class _SpawnWorker(mp_context.SpawnProcess):
+    @staticmethod
+    def _Popen(process_obj):
+        with _main_hidden():
+            return mp_context.SpawnProcess._Popen(process_obj)
+
+
+class _SpawnWorkerContext(mp_context.SpawnContext):
+    Process = _SpawnWorker
+
+
+if 'forkserver' in multiprocessing.get_all_start_methods():
+    class _ForkServerWorker(mp_context.ForkServerProcess):
+        @staticmethod
+        def _Popen(process_obj):
+            with _main_hidden():
+                return mp_context.ForkServerProcess._Popen(process_obj)
+
+    class _ForkServerWorkerContext(mp_context.ForkServerContext):
+        Process = _ForkServerWorker
+
+
+_worker_context = None
+
+
+def worker_context():
+    """Multiprocessing context for render workers: forkserver, else spawn"""
+    global _worker_context
+    if _worker_context is None:
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            _worker_context = _ForkServerWorkerContext()
+            # Workers fork from a server that has already imported the renderer
+            _worker_context.set_forkserver_preload(['certgen.bulk', 'certgen.pool'])
+        else:
+            _worker_context = _SpawnWorkerContext()
+    return _worker_context
+
+
+def _worker_template(template_path, template_sha256):
+    img = _worker_templates.get(template_sha256)
+    if img is None:
+        with metrics.timed('template_load'):
+            img = load_template(template_path)
+        _worker_templates[template_sha256] = img
+        while len(_worker_templates) > WORKER_TEMPLATES:
+            _worker_templates.popitem(last=False)
+    else:
+        _worker_templates.move_to_end(template_sha256)
+    return img
+
+
+def _render_job(name, template_path, template_sha256, kwargs, output_format, output_options,
+                collect_metrics=False):
+    """Render in a worker; return (bytes, stage timings for the parent to record)"""
+    from .encode import encode_certificate
+    from .render import patched_template, render_patches
+
+    metrics.set_enabled(collect_metrics)
+    with metrics.capture() as observations:
+        template_img = _worker_template(template_path, template_sha256)
+        # Each worker runs one job at a time, so pasting into its template is safe
+        patches = render_patches(name, template_img, **kwargs)
+        with patched_template(template_img, patches) as certificate:
+            data = encode_certificate(certificate, output_format, output_options)
+    return data, observations
+
+
+def _env_number(name, default, convert=int):
+    value = os.environ.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        return convert(value)
+    except ValueError:
+        return default
+
+
+class RendererPool:
+    """Bounded front end to a ProcessPoolExecutor of certificate renderers"""
+
+    def __init__(self, workers=None, max_queue=None, timeout=DEFAULT_TIMEOUT):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_queue = self.workers * 2 if max_queue is None else max_queue
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max(1, self.workers + self.max_queue))
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._avg_seconds = 1.0
+        self.submitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=worker_context())
+            return self._executor
+
+    def _reset_executor(self, broken):
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def retry_after(self):
+        """Seconds until a queue slot is likely to free up"""
+        waves = max(1, self._in_flight) / max(1, self.workers)
+        return max(1, math.ceil(waves * self._avg_seconds))
+
+    def _job_done(self, started):
+        def done(_future):
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._in_flight -= 1
+                self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * elapsed
+            self._slots.release()
+        return done
+
+    def _release_unsubmitted(self):
+        # The job never ran, so it does not count towards the average
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def render(self, name, template_path, template_sha256, kwargs,
+               output_format='PNG', output_options=None):
+        """Render and encode one certificate in a worker; return the bytes"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            metrics.inc('certgen_renderer_rejected_total')
+            raise RendererBusy(self.retry_after())
+
+        with self._lock:
+            self._in_flight += 1
+            self.submitted += 1
+        executor = None
+        try:
+            executor = self._get_executor()
+            future = executor.submit(_render_job, name, template_path, template_sha256,
+                                     kwargs, output_format, output_options, metrics.enabled())
+        except BaseException as exc:
+            # Anything raised here (e.g. RuntimeError after shutdown) would
+            # otherwise hold the slot for good
+            self._release_unsubmitted()
+            if isinstance(exc, BrokenProcessPool) and executor is not None:
+                self._reset_executor(executor)
+            raise
+        future.add_done_callback(self._job_done(time.monotonic()))
+
+        try:
+            data, observations = future.result(timeout=self.timeout)
+        except futures.TimeoutError:
+            # The job keeps its queue slot until the worker finishes it
+            with self._lock:
+                self.timed_out += 1
+            metrics.inc('certgen_renderer_timeouts_total')
+            raise
+        except BrokenProcessPool:
+            self._reset_executor(executor)
+            raise
+        metrics.replay(observations)
+        return data
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'in_flight': self._in_flight,
+                'submitted': self.submitted,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_renderer_pool = None
+_renderer_pool_lock = threading.Lock()
+
+
+def get_renderer_pool():
+    """Return the process-wide RendererPool configured from the environment"""
+    global _renderer_pool
+    with _renderer_pool_lock:
+        if _renderer_pool is None:
+            _renderer_pool = RendererPool(
+                workers=_env_number('CERTGEN_POOL_WORKERS', None),
+                max_queue=_env_number('CERTGEN_POOL_QUEUE', None),
+                timeout=_env_number('CERTGEN_POOL_TIMEOUT', DEFAULT_TIMEOUT, float),
+            )
+            metrics.registry.add_collector(_renderer_pool_metrics)
+        return _renderer_pool
+
+
+def _renderer_pool_metrics():
+    stats = _renderer_pool.stats()
+    yield 'certgen_renderer_jobs_total', {}, stats['submitted']
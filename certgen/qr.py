@@ -0,0 +1,55 @@
+"""QR codes drawn onto certificates.
+
+Requires the optional ``qrcode`` package. Modules are drawn as whole
+pixels (no resampling blur), so printed codes stay sharp and scannable.
+"""
+from functools import lru_cache
+
+from PIL import Image
+
+# White modules kept around the code so it scans on any background
+QUIET_ZONE = 2
+
+
+def qr_available():
+    """True if the optional qrcode dependency is installed"""
+    import importlib.util
+
+    return importlib.util.find_spec('qrcode') is not None
+
+
+def _qrcode():
+    try:
+        import qrcode
+    except ImportError:
+        raise RuntimeError("QR codes require the 'qrcode' package (pip install qrcode)") from None
+    return qrcode
+
+
+@lru_cache(maxsize=256)
+def qr_matrix(payload):
+    """Tuple of rows of booleans (True = dark), quiet zone included"""
+    qrcode = _qrcode()
+    code = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M,
+                         box_size=1, border=QUIET_ZONE)
+    code.add_data(payload)
+    code.make(fit=True)
+    return tuple(tuple(row) for row in code.get_matrix())
+
+
+def module_size(matrix, size):
+    """Whole pixels per module for a code at most size pixels wide"""
+    return max(1, int(size) // len(matrix))
+
+
+@lru_cache(maxsize=64)
+def qr_image(payload, size, color=(0, 0, 0)):
+    """RGB image of payload's QR code, at most size pixels square"""
+    matrix = qr_matrix(payload)
+    dark = Image.new('L', (len(matrix), len(matrix)))
+    dark.putdata([255 if module else 0 for row in matrix for module in row])
+    scale = module_size(matrix, size)
+    dark = dark.resize((len(matrix) * scale,) * 2, Image.Resampling.NEAREST)
+    img = Image.new('RGB', dark.size, (255, 255, 255))
+    img.paste(tuple(color[:3]), mask=dark)
+    return img
@@ -0,0 +1,421 @@
+"""Certificate rendering, free of any Streamlit dependency"""
+from contextlib import contextmanager
+from functools import lru_cache
+
+from PIL import Image, ImageDraw
+
+from . import metrics
+from .fonts import resolve_font
+from .verify import certificate_id, id_version, verification_payload
+
+
+def normalize_color(color):
+    """Coerce a JSON list / tuple colour to an int tuple, defaulting to black"""
+    if isinstance(color, (list, tuple)):
+        return tuple(int(c) for c in color)
+    return (0, 0, 0)
+
+
+# Text fields containing one of these are drawn per person; the rest are baked
+PLACEHOLDERS = ('{name}', '{certificate_id}')
+
+
+def is_dynamic_field(field):
+    """True for fields that differ between attendees (QR codes always do)"""
+    if field.get('type') == 'qr':
+        return True
+    return field.get('type') == 'text' and any(p in field.get('text', '') for p in PLACEHOLDERS)
+
+
+def uses_certificate_id(fields):
+    """True if any field shows the certificate ID, as text or as a QR code"""
+    return any(field.get('type') == 'qr' or '{certificate_id}' in field.get('text', '')
+               for field in fields or ())
+
+
+def fill_placeholders(text, name, cert_id=''):
+    """Text of a per-person field with its placeholders filled in"""
+    return text.replace('{name}', name).replace('{certificate_id}', cert_id or '')
+
+
+def certificate_kwargs(config):
+    """Map a cert_config-style dict onto generate_certificate keyword arguments"""
+    fit_to_box = config.get('fit_to_box', False)
+    kwargs = {
+        'x': config.get('name_x', 500),
+        'y': config.get('name_y', 400),
+        'font_size': config.get('font_size', 60),
+        'color': normalize_color(config.get('font_color', (0, 0, 0))),
+        'font_family': config.get('font_family', 'Arial'),
+        'font_weight': config.get('font_weight', 'Regular'),
+        'is_italic': config.get('is_italic', False),
+        'custom_font_path': config.get('custom_font_path'),
+        'stroke_width': config.get('stroke_width', 0),
+        'stroke_color': normalize_color(config.get('stroke_color', (0, 0, 0))),
+        'max_width': (config.get('box_width') or None) if fit_to_box else None,
+        'max_height': (config.get('box_height') or None) if fit_to_box else None,
+        'fields': [dict(field) for field in config.get('fields') or () if is_dynamic_field(field)],
+    }
+    # Only layouts that show IDs carry a version, so other layouts hash as before
+    if uses_certificate_id(kwargs['fields']):
+        kwargs['id_version'] = id_version(config)
+    return kwargs
+
+
+def text_width(font, name, font_size, draw=None):
+    """Width of name in font, as used to centre it on the X position"""
+    if draw is None:
+        draw = ImageDraw.Draw(Image.new('RGB', (1, 1)))
+    try:
+        bbox = draw.textbbox((0, 0), name, font=font)
+        return bbox[2] - bbox[0]
+    except Exception:
+        return len(name) * (int(font_size) // 2)
+
+
+# Auto-fit never shrinks a name below this size
+MIN_FIT_FONT_SIZE = 8
+
+_MEASURE = ImageDraw.Draw(Image.new('RGB', (1, 1)))
+
+
+@lru_cache(maxsize=65536)
+def _text_extent(font, text, stroke_width):
+    """(ink width, line height) of text; fonts are per size, so this memoises per size"""
+    try:
+        left, _, right, _ = _MEASURE.textbbox((0, 0), text, font=font, stroke_width=stroke_width)
+        width = right - left
+    except Exception:
+        width = len(text) * (getattr(font, 'size', 10) // 2) + 2 * stroke_width
+    try:
+        ascent, descent = font.getmetrics()
+    except Exception:
+        ascent, descent = getattr(font, 'size', 10), 0
+    return width, ascent + descent + 2 * stroke_width
+
+
+def fit_font_size(name, font_size, max_width=None, max_height=None, font_family='Arial',
+                  font_weight='Regular', is_italic=False, custom_font_path=None, stroke_width=0):
+    """Largest size up to font_size at which name fits max_width x max_height.
+
+    Text extent grows almost linearly with size, so the first probe is the
+    proportional estimate and its neighbour; a binary search over the
+    remaining range only runs when hinting makes that guess wrong. Fonts
+    come from the font cache and measurements are memoised.
+    """
+    stroke_width = int(stroke_width)
+
+    def measure(size):
+        font = resolve_font(size, font_family, font_weight, is_italic, custom_font_path)
+        return _text_extent(font, name, stroke_width)
+
+    def fits(size):
+        width, height = measure(size)
+        return (not max_width or width <= max_width) and (not max_height or height <= max_height)
+
+    font_size = int(font_size)
+    if font_size <= MIN_FIT_FONT_SIZE:
+        return font_size
+    width, height = measure(font_size)
+    ratios = []
+    if max_width and width > max_width:
+        ratios.append(max_width / width)
+    if max_height and height > max_height:
+        ratios.append(max_height / height)
+    if not ratios:
+        return font_size
+
+    best, low, high = MIN_FIT_FONT_SIZE, MIN_FIT_FONT_SIZE + 1, font_size - 1
+    if low > high:
+        return best
+    guess = min(high, max(low, int(font_size * min(ratios))))
+    if fits(guess):
+        best, low = guess, guess + 1
+        if low > high or not fits(low):
+            return best
+        best, low = low, low + 1
+    else:
+        high = guess - 1
+        if high < low:
+            return best
+        if fits(high):
+            return high
+        high -= 1
+    while low <= high:
+        mid = (low + high) // 2
+        if fits(mid):
+            best, low = mid, mid + 1
+        else:
+            high = mid - 1
+    return best
+
+
+def _layout_name(name, x, y, font_size, color, font_family, font_weight, is_italic,
+                 custom_font_path, stroke_width, stroke_color, draw=None,
+                 max_width=None, max_height=None):
+    """Resolve font and colours and compute where name is drawn"""
+    top = int(y)
+    if max_width or max_height:
+        with metrics.timed('autofit'):
+            font_size = fit_font_size(name, font_size, max_width, max_height, font_family,
+                                      font_weight, is_italic, custom_font_path, stroke_width)
+    with metrics.timed('font_resolve'):
+        font = resolve_font(font_size, font_family, font_weight, is_italic, custom_font_path)
+    if max_height:
+        # The box starts at Y; shrunken names are centred in it vertically
+        top += (int(max_height) - _text_extent(font, name, int(stroke_width))[1]) // 2
+    with metrics.timed('textbbox'):
+        left = int(x) - text_width(font, name, font_size, draw) // 2
+    return {
+        'xy': (left, top),
+        'font': font,
+        'fill': normalize_color(color),
+        'stroke_width': int(stroke_width),
+        'stroke_fill': normalize_color(stroke_color),
+    }
+
+
+def _draw_name(draw, name, layout, offset=(0, 0)):
+    left, top = layout['xy']
+    xy = (left - offset[0], top - offset[1])
+    with metrics.timed('draw_text'):
+        if layout['stroke_width'] > 0:
+            draw.text(xy, name, font=layout['font'], fill=layout['fill'],
+                      stroke_width=layout['stroke_width'], stroke_fill=layout['stroke_fill'])
+        else:
+            draw.text(xy, name, font=layout['font'], fill=layout['fill'])
+
+
+def _layout_field(field, text, draw=None):
+    """Resolve font and position of an extra text field (x is its anchor)"""
+    font_size = int(field.get('font_size', 32))
+    font = resolve_font(font_size, field.get('font_family', 'Arial'),
+                        field.get('font_weight', 'Regular'), field.get('is_italic', False),
+                        field.get('custom_font_path'))
+    left = int(field.get('x', 0))
+    align = field.get('align', 'center')
+    if align != 'left':
+        width = text_width(font, text, font_size, draw)
+        left -= width // 2 if align == 'center' else width
+    return {
+        'xy': (left, int(field.get('y', 0))),
+        'font': font,
+        'fill': normalize_color(field.get('color', (0, 0, 0))),
+        'stroke_width': 0,
+        'stroke_fill': (0, 0, 0),
+    }
+
+
+def _layout_qr(field, payload):
+    """QR code image of payload and its top-left corner (x is its anchor)"""
+    from .qr import qr_image
+
+    image = qr_image(payload, int(field.get('size', 160)),
+                     normalize_color(field.get('color', (0, 0, 0))))
+    left = int(field.get('x', 0))
+    align = field.get('align', 'center')
+    if align != 'left':
+        left -= image.width // 2 if align == 'center' else image.width
+    return {'xy': (left, int(field.get('y', 0))), 'image': image}
+
+
+def _layout_dynamic(field, name, cert_id, draw=None):
+    """Return (text, layout) of a per-person field; text is None for QR codes"""
+    if field.get('type') == 'qr':
+        return None, _layout_qr(field, verification_payload(cert_id, field.get('verify_url')))
+    text = fill_placeholders(field['text'], name, cert_id)
+    return text, _layout_field(field, text, draw)
+
+
+def _paint(img, draw, text, layout, offset=(0, 0)):
+    if 'image' in layout:
+        left, top = layout['xy']
+        img.paste(layout['image'], (left - offset[0], top - offset[1]))
+    else:
+        _draw_name(draw, text, layout, offset)
+
+
+def generate_certificate(name, template_img, x, y, font_size, color,
+                         font_family='Arial', font_weight='Regular', is_italic=False,
+                         custom_font_path=None,
+                         stroke_width=0, stroke_color=(0, 0, 0),
+                         max_width=None, max_height=None, fields=(), id_version=None):
+    """Generate certificate with name on template.
+
+    With max_width and/or max_height the font shrinks from font_size until
+    the name fits a box centred on X whose top edge is Y. ``fields`` are the
+    per-person fields drawn after the name; static fields are expected to
+    be baked into template_img already. ``id_version`` is the layout
+    version certificate IDs are derived from, for fields that show one.
+    """
+    with metrics.timed('template_copy'):
+        img = template_img.copy()
+    draw = ImageDraw.Draw(img)
+    layout = _layout_name(name, x, y, font_size, color, font_family, font_weight, is_italic,
+                          custom_font_path, stroke_width, stroke_color, draw,
+                          max_width, max_height)
+    _draw_name(draw, name, layout)
+    cert_id = certificate_id(name, id_version) if id_version else ''
+    for field in fields:
+        text, field_layout = _layout_dynamic(field, name, cert_id, draw)
+        _paint(img, draw, text, field_layout)
+    return img
+
+
+# Extra pixels around the text bbox so antialiased edges are never clipped
+PATCH_MARGIN = 2
+
+
+def _text_box(text, layout, template_img):
+    if 'image' in layout:
+        left, top = layout['xy']
+        width, height = template_img.size
+        box = (max(0, left), max(0, top), min(width, left + layout['image'].width),
+               min(height, top + layout['image'].height))
+        return box if box[0] < box[2] and box[1] < box[3] else None
+    measure = ImageDraw.Draw(Image.new(template_img.mode, (1, 1)))
+    left, top, right, bottom = measure.textbbox(layout['xy'], text, font=layout['font'],
+                                                stroke_width=layout['stroke_width'])
+    width, height = template_img.size
+    box = (max(0, left - PATCH_MARGIN), max(0, top - PATCH_MARGIN),
+           min(width, right + PATCH_MARGIN), min(height, bottom + PATCH_MARGIN))
+    if box[0] >= box[2] or box[1] >= box[3]:
+        return None
+    return box
+
+
+def _overlaps(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def render_name_patch(name, template_img, x, y, font_size, color,
+                      font_family='Arial', font_weight='Regular', is_italic=False,
+                      custom_font_path=None,
+                      stroke_width=0, stroke_color=(0, 0, 0),
+                      max_width=None, max_height=None, fields=(), id_version=None):
+    """Render only the strip of the certificate that the name touches.
+
+    Returns (box, patch): pasting patch into a copy of template_img at box
+    gives exactly what generate_certificate returns for the name alone, but
+    only the strip is copied and drawn on. ``fields`` is ignored; use
+    render_patches to include them. Returns (None, None) when nothing lands
+    on the image.
+    """
+    layout = _layout_name(name, x, y, font_size, color, font_family, font_weight, is_italic,
+                          custom_font_path, stroke_width, stroke_color,
+                          max_width=max_width, max_height=max_height)
+    box = _text_box(name, layout, template_img)
+    if box is None:
+        return None, None
+
+    patch = template_img.crop(box)
+    _draw_name(ImageDraw.Draw(patch), name, layout, offset=box[:2])
+    return box, patch
+
+
+def render_patches(name, template_img, x, y, font_size, color,
+                   font_family='Arial', font_weight='Regular', is_italic=False,
+                   custom_font_path=None,
+                   stroke_width=0, stroke_color=(0, 0, 0),
+                   max_width=None, max_height=None, fields=(), id_version=None):
+    """Render the name and every per-person field as [(box, patch), ...].
+
+    Pasting every patch into template_img gives exactly what
+    generate_certificate returns. Overlapping fields share one patch so they
+    are drawn in the same order as the full render. template_img must be RGB
+    or RGBA (see templates.load_template): palette colours added while
+    drawing on a patch would not survive the paste.
+    """
+    texts = [(name, _layout_name(name, x, y, font_size, color, font_family, font_weight,
+                                 is_italic, custom_font_path, stroke_width, stroke_color,
+                                 max_width=max_width, max_height=max_height))]
+    cert_id = certificate_id(name, id_version) if id_version else ''
+    for field in fields:
+        texts.append(_layout_dynamic(field, name, cert_id))
+
+    groups = []
+    for order, (text, layout) in enumerate(texts):
+        box = _text_box(text, layout, template_img)
+        if box is None:
+            continue
+        members = [order]
+        merged = True
+        while merged:
+            merged = False
+            for group in groups:
+                if _overlaps(group[0], box):
+                    groups.remove(group)
+                    box = (min(box[0], group[0][0]), min(box[1], group[0][1]),
+                           max(box[2], group[0][2]), max(box[3], group[0][3]))
+                    members += group[1]
+                    merged = True
+                    break
+        groups.append((box, members))
+
+    patches = []
+    for box, members in groups:
+        patch = template_img.crop(box)
+        draw = ImageDraw.Draw(patch)
+        for order in sorted(members):
+            text, layout = texts[order]
+            _paint(patch, draw, text, layout, offset=box[:2])
+        patches.append((box, patch))
+    return patches
+
+
+@contextmanager
+def patched_template(template_img, patches):
+    """Temporarily paste [(box, patch), ...] into template_img in place.
+
+    Avoids copying the full template when encoding, but mutates it, so only
+    use it where the template is not shared between threads (e.g. inside a
+    bulk worker process). The original pixels are restored on exit.
+    """
+    originals = [(box, template_img.crop(box)) for box, _ in patches]
+    for box, patch in patches:
+        template_img.paste(patch, box)
+    try:
+        yield template_img
+    finally:
+        for box, original in reversed(originals):
+            template_img.paste(original, box)
+
+
+# Width of the template copy used for the Admin Panel live preview
+PREVIEW_WIDTH = 960
+
+
+def downscale_template(template_img, max_width=PREVIEW_WIDTH):
+    """Return (template scaled to at most max_width wide, scale factor)"""
+    if template_img.width <= max_width:
+        return template_img, 1.0
+    scale = max_width / template_img.width
+    size = (max_width, max(1, round(template_img.height * scale)))
+    return template_img.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0), scale
+
+
+def scale_kwargs(kwargs, scale):
+    """Scale position, font size and stroke of render kwargs to a resized template"""
+    scaled = dict(kwargs)
+    scaled['x'] = round(int(kwargs['x']) * scale)
+    scaled['y'] = round(int(kwargs['y']) * scale)
+    scaled['font_size'] = max(1, round(int(kwargs['font_size']) * scale))
+    stroke_width = int(kwargs.get('stroke_width', 0))
+    scaled['stroke_width'] = max(1, round(stroke_width * scale)) if stroke_width > 0 else 0
+    for key in ('max_width', 'max_height'):
+        if kwargs.get(key):
+            scaled[key] = max(1, round(int(kwargs[key]) * scale))
+    if kwargs.get('fields'):
+        scaled['fields'] = [scale_field(field, scale) for field in kwargs['fields']]
+    return scaled
+
+
+def scale_field(field, scale):
+    """Scale an extra field's position and size to a resized template"""
+    scaled = dict(field)
+    scaled['x'] = round(int(field.get('x', 0)) * scale)
+    scaled['y'] = round(int(field.get('y', 0)) * scale)
+    for key in ('font_size', 'width', 'size'):
+        if field.get(key):
+            scaled[key] = max(1, round(int(field[key]) * scale))
+    return scaled
@@ -0,0 +1,222 @@
+"""Streaming roster import from CSV, XLSX or pasted text.
+
+Rows are read one at a time (XLSX through openpyxl's read-only mode), so
+the parsed file is never held in memory. Each name is normalised (NFC,
+single spaces), validated and checked against the existing roster and the
+rest of the file through a hash set of comparison keys. New names are
+written in batches, one transaction each. Every rejected row can be
+streamed to a CSV report; only the first REPORT_PREVIEW are kept for
+display.
+
+XLSX support needs the optional ``openpyxl`` package.
+"""
+import csv
+import io
+import os
+import unicodedata
+from dataclasses import dataclass, field
+
+from .lookup import normalize_lookup
+
+# Names written per storage transaction
+IMPORT_BATCH = 5000
+MAX_NAME_LENGTH = 200
+# Rejected rows kept on the report for display; the CSV report has all of them
+REPORT_PREVIEW = 200
+# Header cells recognised as the name column (compared casefolded)
+NAME_HEADERS = ('name', 'full name', 'full_name', 'fullname', 'participant',
+                'participant name', 'attendee', 'attendee name', 'student name')
+FIRST_NAME_HEADERS = ('first name', 'first_name', 'firstname', 'given name')
+LAST_NAME_HEADERS = ('last name', 'last_name', 'lastname', 'surname', 'family name')
+ROSTER_EXTENSIONS = ('.csv', '.txt', '.xlsx')
+
+
+@dataclass
+class ImportReport:
+    """Counts for one import plus a preview of the rejected rows"""
+    rows: int = 0
+    added: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    blank: int = 0
+    problems: list = field(default_factory=list)
+
+    def reject(self, row, value, reason, writer=None):
+        if len(self.problems) < REPORT_PREVIEW:
+            self.problems.append({'Row': row, 'Value': value, 'Problem': reason})
+        if writer is not None:
+            writer.writerow((row, value, reason))
+
+
+def xlsx_available():
+    """True if the optional openpyxl dependency is installed"""
+    import importlib.util
+
+    return importlib.util.find_spec('openpyxl') is not None
+
+
+def clean_name(value):
+    """Display form of an imported name: NFC with whitespace collapsed"""
+    if value is None:
+        return ''
+    return ' '.join(unicodedata.normalize('NFC', str(value)).split())
+
+
+def validate_name(name):
+    """Reason name cannot be registered, or None if it is fine"""
+    if len(name) > MAX_NAME_LENGTH:
+        return f"longer than {MAX_NAME_LENGTH} characters"
+    if any(unicodedata.category(ch) in ('Cc', 'Cs') for ch in name):
+        return "contains control characters"
+    if not any(ch.isalpha() for ch in name):
+        return "contains no letters"
+    return None
+
+
+def _header_picker(header):
+    """Function picking the name out of a row, if header is a header row"""
+    cells = [clean_name(cell).casefold() for cell in header]
+    for i, cell in enumerate(cells):
+        if cell in NAME_HEADERS:
+            return lambda row: row[i] if i < len(row) else None
+    first = next((i for i, cell in enumerate(cells) if cell in FIRST_NAME_HEADERS), None)
+    last = next((i for i, cell in enumerate(cells) if cell in LAST_NAME_HEADERS), None)
+    if first is not None and last is not None:
+        def pick(row):
+            parts = [row[j] for j in (first, last) if j < len(row) and row[j] is not None]
+            return ' '.join(str(part) for part in parts)
+        return pick
+    return None
+
+
+def _first_column(row):
+    return row[0] if row else None
+
+
+def _names_from_rows(rows):
+    """Yield (row number, raw value) from an iterator of row sequences"""
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        return
+    pick = _header_picker(header)
+    if pick is None:
+        # No header: the first column holds the names, starting on row 1
+        pick = _first_column
+        yield 1, pick(header)
+    for number, row in enumerate(rows, start=2):
+        yield number, pick(row)
+
+
+def _text_stream(fileobj):
+    sample = fileobj.read(64 * 1024)
+    fileobj.seek(0)
+    try:
+        sample.decode('utf-8')
+        encoding = 'utf-8-sig'
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off at the end of the sample is still UTF-8
+        encoding = 'utf-8-sig' if e.start >= len(sample) - 3 else 'cp1252'
+    return io.TextIOWrapper(fileobj, encoding=encoding, newline=''), sample
+
+
+def iter_csv_names(fileobj):
+    """Yield (row number, raw name) from a binary CSV (or plain list) file"""
+    text, sample = _text_stream(fileobj)
+    try:
+        dialect = csv.Sniffer().sniff(sample.decode('latin-1')[:8192], delimiters=',;\t|')
+    except csv.Error:
+        dialect = csv.excel
+    try:
+        yield from _names_from_rows(csv.reader(text, dialect))
+    finally:
+        text.detach()
+
+
+def iter_xlsx_names(fileobj):
+    """Yield (row number, raw name) from the first sheet of an XLSX workbook"""
+    try:
+        import openpyxl
+    except ImportError:
+        raise RuntimeError("XLSX import requires the 'openpyxl' package "
+                           "(pip install openpyxl)") from None
+    workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        yield from _names_from_rows(workbook.worksheets[0].iter_rows(values_only=True))
+    finally:
+        workbook.close()
+
+
+def iter_text_names(text):
+    """Yield (line number, raw name) from text with one name per line"""
+    return enumerate(text, start=1)
+
+
+def iter_roster_names(fileobj, filename):
+    """Yield (row number, raw name) from an uploaded roster, by file extension"""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == '.xlsx':
+        return iter_xlsx_names(fileobj)
+    if ext == '.txt':
+        return _iter_text_file(fileobj)
+    return iter_csv_names(fileobj)
+
+
+def _iter_text_file(fileobj):
+    text, _ = _text_stream(fileobj)
+    try:
+        yield from iter_text_names(text)
+    finally:
+        text.detach()
+
+
+def import_roster(storage, rows, existing=(), batch_size=IMPORT_BATCH, report_file=None,
+                  progress=None):
+    """Add the valid, new names from rows of (row number, raw name) to storage.
+
+    ``existing`` is the current roster. Names are deduplicated ignoring
+    case, accents composed differently and extra spaces, against both the
+    roster and earlier rows. Rejected rows are written to ``report_file``
+    (a text file) as CSV when given. ``progress(rows_read, added)`` is
+    called after each batch. Returns an ImportReport.
+    """
+    report = ImportReport()
+    # Comparison key -> first row it appeared on (None for registered names)
+    seen = dict.fromkeys(normalize_lookup(name) for name in existing)
+    writer = None
+    if report_file is not None:
+        writer = csv.writer(report_file)
+        writer.writerow(('row', 'value', 'problem'))
+    batch = []
+
+    def flush():
+        report.added += storage.add_participants(batch)
+        batch.clear()
+        if progress is not None:
+            progress(report.rows, report.added)
+
+    for number, value in rows:
+        report.rows += 1
+        name = clean_name(value)
+        if not name:
+            report.blank += 1
+            continue
+        reason = validate_name(name)
+        if reason is not None:
+            report.invalid += 1
+            report.reject(number, name, reason, writer)
+            continue
+        key = normalize_lookup(name)
+        if key in seen:
+            report.duplicates += 1
+            first = seen[key]
+            report.reject(number, name, f"duplicate of row {first}" if first
+                          else "already registered", writer)
+            continue
+        seen[key] = number
+        batch.append(name)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return report
@@ -0,0 +1,75 @@
+"""Process-wide, change-aware snapshot of the stored configuration.
+
+Every Streamlit rerun used to re-read the whole store. Instead, one
+immutable ConfigSnapshot is shared by all sessions and only rebuilt when
+the store's revision changes; the revision itself is checked at most once
+per ``check_interval`` seconds, and local writes invalidate it immediately.
+"""
+import threading
+import time
+from types import MappingProxyType
+
+from .participants import ParticipantStore
+from .storage import get_storage
+
+
+class ConfigSnapshot:
+    """Read-only layout settings and participants at one store revision"""
+
+    __slots__ = ('revision', 'layout', 'participants')
+
+    def __init__(self, revision, config):
+        config = dict(config)
+        self.revision = revision
+        self.participants = ParticipantStore(config.pop('participants'), frozen=True)
+        self.layout = MappingProxyType(config)
+
+
+class SnapshotCache:
+    """Hands out the current ConfigSnapshot, reloading only on change"""
+
+    def __init__(self, storage, check_interval=1.0):
+        self.storage = storage
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def get(self):
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return snapshot
+            revision = self.storage.revision()
+            if snapshot is None or snapshot.revision != revision:
+                snapshot = ConfigSnapshot(revision, self.storage.read_config())
+                self._snapshot = snapshot
+                self.reloads += 1
+            self._checked_at = time.monotonic()
+            return snapshot
+
+    def invalidate(self):
+        """Force a revision check on the next get(), e.g. after a local write"""
+        self._checked_at = 0.0
+
+
+_snapshots = None
+_snapshots_lock = threading.Lock()
+
+
+def get_snapshot_cache():
+    """Return the process-wide SnapshotCache over the default storage"""
+    global _snapshots
+    with _snapshots_lock:
+        if _snapshots is None:
+            _snapshots = SnapshotCache(get_storage())
+        return _snapshots
+
+
+def get_config_snapshot():
+    """Return the current ConfigSnapshot"""
+    return get_snapshot_cache().get()
@@ -0,0 +1,228 @@
+"""Pluggable persistence for layout settings and the participant roster.
+
+``SqliteStorage`` (the default) keeps participants in their own table, so
+adding or removing one name is a single-row transaction, and keeps every
+saved layout as a numbered version. WAL mode lets any number of readers
+proceed while one writer commits. ``JsonStorage`` keeps the original
+whole-file cert_config.json behaviour for setups that still want it.
+"""
+import json
+import os
+from abc import ABC, abstractmethod
+import threading
+import time
+
+from .config import (CONFIG_PATH, DEFAULT_CONFIG, default_config, read_config,
+                     save_config)
+from .db import Database
+
+STORE_PATH = 'cert_store.db'
+
+LAYOUT_KEYS = tuple(key for key in DEFAULT_CONFIG if key != 'participants')
+
+# Saved layout versions kept for history; older ones are pruned
+LAYOUT_HISTORY = 50
+
+
+def _layout_json(config):
+    layout = {key: config.get(key, DEFAULT_CONFIG[key]) for key in LAYOUT_KEYS}
+    return json.dumps(layout, default=list)
+
+
+def _decode_layout(data):
+    layout = json.loads(data)
+    for key in ('font_color', 'stroke_color'):
+        if isinstance(layout.get(key), list):
+            layout[key] = tuple(layout[key])
+    return layout
+
+
+class Storage(ABC):
+    """Interface shared by the storage backends"""
+
+    @abstractmethod
+    def read_config(self):
+        """Return the saved layout plus 'participants' as a list"""
+
+    @abstractmethod
+    def save_layout(self, config):
+        """Persist the layout keys of config; participants are untouched"""
+
+    @abstractmethod
+    def add_participants(self, names):
+        """Add new names; return how many were added"""
+
+    @abstractmethod
+    def remove_participant(self, name):
+        """Remove name; return False if it was not registered"""
+
+    @abstractmethod
+    def revision(self):
+        """Counter that changes whenever anything is written"""
+
+
+class JsonStorage(Storage):
+    """cert_config.json backend: every write rewrites the whole file"""
+
+    def __init__(self, path=CONFIG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def read_config(self):
+        config = default_config()
+        config.update(read_config(self.path))
+        config['participants'] = list(config['participants'])
+        return config
+
+    def save_layout(self, config):
+        with self._lock:
+            saved = self.read_config()
+            saved.update({key: config.get(key, DEFAULT_CONFIG[key]) for key in LAYOUT_KEYS})
+            save_config(saved, self.path)
+
+    def add_participants(self, names):
+        with self._lock:
+            saved = self.read_config()
+            existing = set(saved['participants'])
+            added = [name for name in dict.fromkeys(names) if name not in existing]
+            if added:
+                saved['participants'].extend(added)
+                save_config(saved, self.path)
+            return len(added)
+
+    def remove_participant(self, name):
+        with self._lock:
+            saved = self.read_config()
+            if name not in saved['participants']:
+                return False
+            saved['participants'].remove(name)
+            save_config(saved, self.path)
+            return True
+
+    def revision(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return 0
+
+
+class SqliteStorage(Storage):
+    """SQLite backend in WAL mode with one connection per thread"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS layout_versions (
+            version  INTEGER PRIMARY KEY AUTOINCREMENT,
+            saved_at REAL NOT NULL,
+            settings TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS participants (
+            id   INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key   TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        INSERT OR IGNORE INTO meta (key, value) VALUES ('revision', '0');
+    """
+
+    def __init__(self, path=STORE_PATH, migrate_from=CONFIG_PATH):
+        self.path = path
+        self.db = Database(path, self.SCHEMA)
+        if migrate_from:
+            self.migrate_from_json(migrate_from)
+
+    @staticmethod
+    def _bump(conn):
+        conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'revision'")
+
+    def read_config(self):
+        conn = self.db.connect()
+        config = default_config()
+        row = conn.execute(
+            "SELECT settings FROM layout_versions ORDER BY version DESC LIMIT 1").fetchone()
+        if row is not None:
+            config.update(_decode_layout(row[0]))
+        config['participants'] = [
+            name for (name,) in conn.execute("SELECT name FROM participants ORDER BY id")]
+        return config
+
+    def layout_version(self):
+        """Number of the most recently saved layout (0 if none)"""
+        row = self.db.connect().execute("SELECT MAX(version) FROM layout_versions").fetchone()
+        return row[0] or 0
+
+    def save_layout(self, config):
+        with self.db.transaction() as conn:
+            conn.execute("INSERT INTO layout_versions (saved_at, settings) VALUES (?, ?)",
+                         (time.time(), _layout_json(config)))
+            conn.execute("DELETE FROM layout_versions WHERE version <= "
+                         "(SELECT MAX(version) FROM layout_versions) - ?", (LAYOUT_HISTORY,))
+            self._bump(conn)
+
+    def add_participants(self, names):
+        with self.db.transaction() as conn:
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO participants (name) VALUES (?)",
+                             ((name,) for name in names))
+            added = conn.total_changes - before
+            if added:
+                self._bump(conn)
+            return added
+
+    def remove_participant(self, name):
+        with self.db.transaction() as conn:
+            removed = conn.execute("DELETE FROM participants WHERE name = ?", (name,)).rowcount
+            if removed:
+                self._bump(conn)
+            return bool(removed)
+
+    def revision(self):
+        row = self.db.connect().execute(
+            "SELECT value FROM meta WHERE key = 'revision'").fetchone()
+        return int(row[0]) if row else 0
+
+    def migrate_from_json(self, json_path):
+        """Import cert_config.json once, if this store has never been written to"""
+        if not os.path.exists(json_path):
+            return False
+        with self.db.transaction() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_from'").fetchone():
+                return False
+            if (conn.execute("SELECT 1 FROM layout_versions LIMIT 1").fetchone()
+                    or conn.execute("SELECT 1 FROM participants LIMIT 1").fetchone()):
+                return False
+            config = default_config()
+            config.update(read_config(json_path))
+            conn.execute("INSERT INTO layout_versions (saved_at, settings) VALUES (?, ?)",
+                         (time.time(), _layout_json(config)))
+            conn.executemany("INSERT OR IGNORE INTO participants (name) VALUES (?)",
+                             ((name,) for name in config['participants']))
+            conn.execute("INSERT INTO meta (key, value) VALUES ('migrated_from', ?)",
+                         (os.path.abspath(json_path),))
+            self._bump(conn)
+        return True
+
+
+def open_storage(path=None):
+    """Open the backend for path: '.json' files use JsonStorage, else SQLite.
+
+    Without a path, CERTGEN_STORE (default cert_store.db) is used.
+    """
+    path = path or os.environ.get('CERTGEN_STORE', STORE_PATH)
+    if path.endswith('.json'):
+        return JsonStorage(path)
+    return SqliteStorage(path)
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """Return the process-wide default storage backend"""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            _storage = open_storage()
+        return _storage
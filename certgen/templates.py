@@ -0,0 +1,172 @@
+"""Template normalisation and precomputed resolution variants.
+
+Uploads are decoded once, converted to RGB (or RGBA when they really use
+transparency) and stripped of metadata other than the resolution and an
+RGB colour profile, so renders never pay for palette, CMYK or 16-bit
+conversions and PDFs keep the template's physical size. Three variants are
+written under TEMPLATE_DIR, each named by its content hash:
+
+- ``print``: the normalised full-resolution master that certificates use
+- ``web``: at most WEB_WIDTH wide, for on-screen display
+- ``thumb``: at most THUMB_WIDTH wide, for the Admin Panel template preview
+
+A JSON sidecar next to the master records every variant's path, size and
+sha256.
+"""
+import hashlib
+import io
+import json
+import os
+
+from PIL import Image, ImageOps
+
+TEMPLATE_DIR = 'templates'
+WEB_WIDTH = 1600
+THUMB_WIDTH = 320
+VARIANT_WIDTHS = {'web': WEB_WIDTH, 'thumb': THUMB_WIDTH}
+# Source modes whose ICC profile still describes the pixels after conversion
+RGB_PROFILE_MODES = ('RGB', 'RGBA', 'P', 'PA')
+# Modes render_patches can draw on and paste back exactly
+RENDER_MODES = ('RGB', 'RGBA')
+
+
+def _has_alpha(img):
+    if img.mode in ('RGBA', 'LA', 'PA'):
+        return img.getchannel('A').getextrema()[0] < 255
+    return img.mode == 'P' and 'transparency' in img.info
+
+
+def normalize_template(img):
+    """Return img upright, in RGB/RGBA, keeping only its DPI and RGB colour profile"""
+    kept = {}
+    if img.info.get('dpi'):
+        kept['dpi'] = tuple(img.info['dpi'])
+    if img.info.get('icc_profile') and img.mode in RGB_PROFILE_MODES:
+        # Conversion is not colour-managed, so a CMYK or grey profile would be wrong
+        kept['icc_profile'] = img.info['icc_profile']
+    img = ImageOps.exif_transpose(img)
+    normalized = _convert(img)
+    if normalized is img:
+        normalized = img.copy()
+    normalized.info = kept
+    return normalized
+
+
+def _convert(img):
+    if img.mode in ('I;16', 'I;16B', 'I;16L', 'I'):
+        # 16-bit greyscale: keep the top 8 bits rather than clipping at 255
+        img = img.convert('I').point(lambda v: v * (1 / 256)).convert('L')
+    elif img.mode == 'F':
+        img = img.convert('L')
+    return img.convert('RGBA' if _has_alpha(img) else 'RGB')
+
+
+def render_ready(img):
+    """Return img in RGB or RGBA, converting templates saved before normalisation.
+
+    Text drawn on a cropped palette image adds its colour to the crop's own
+    palette, which is lost when the crop is pasted back, so patch rendering
+    needs a true-colour template. The DPI is kept, the ICC profile only when
+    it still describes the converted pixels.
+    """
+    if img.mode in RENDER_MODES:
+        return img
+    converted = _convert(img)
+    converted.info = {key: img.info[key] for key in ('dpi',) if img.info.get(key)}
+    if img.info.get('icc_profile') and img.mode in RGB_PROFILE_MODES:
+        converted.info['icc_profile'] = img.info['icc_profile']
+    return converted
+
+
+def load_template(fp):
+    """Open and decode a template (path or file object), ready for rendering"""
+    img = Image.open(fp)
+    img.load()
+    return render_ready(img)
+
+
+def save_info(img):
+    """Keyword arguments for Image.save that keep img's DPI and colour profile"""
+    params = {}
+    if img.info.get('dpi'):
+        params['dpi'] = tuple(round(float(d)) for d in img.info['dpi'])
+    if img.info.get('icc_profile'):
+        params['icc_profile'] = img.info['icc_profile']
+    return params
+
+
+def _encode(img, kind):
+    buf = io.BytesIO()
+    if kind == 'print' or img.mode == 'RGBA':
+        img.save(buf, format='PNG', compress_level=6, **save_info(img))
+        return buf.getvalue(), 'png'
+    img.save(buf, format='JPEG', quality=85, optimize=True, **save_info(img))
+    return buf.getvalue(), 'jpg'
+
+
+def _resize(img, max_width):
+    if img.width <= max_width:
+        return img
+    height = max(1, round(img.height * max_width / img.width))
+    resized = img.resize((max_width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+    if img.info.get('dpi'):
+        # Same physical size, fewer pixels
+        resized.info['dpi'] = tuple(float(d) * max_width / img.width for d in img.info['dpi'])
+    return resized
+
+
+def _write(path, data):
+    if os.path.exists(path):
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def sidecar_path(template_path):
+    return os.path.splitext(template_path)[0] + '.json'
+
+
+def save_template(data, directory=TEMPLATE_DIR):
+    """Normalise uploaded image bytes and write all variants; return the master path"""
+    with Image.open(io.BytesIO(data)) as upload:
+        master = normalize_template(upload)
+    os.makedirs(directory, exist_ok=True)
+
+    master_bytes, ext = _encode(master, 'print')
+    master_sha = hashlib.sha256(master_bytes).hexdigest()
+    stem = os.path.join(directory, master_sha[:16])
+    master_path = f"{stem}.{ext}"
+    _write(master_path, master_bytes)
+
+    variants = {'print': {'path': master_path, 'sha256': master_sha,
+                          'width': master.width, 'height': master.height}}
+    for kind, max_width in VARIANT_WIDTHS.items():
+        resized = _resize(master, max_width)
+        variant_bytes, ext = _encode(resized, kind)
+        path = f"{stem}.{kind}.{ext}"
+        _write(path, variant_bytes)
+        variants[kind] = {'path': path, 'sha256': hashlib.sha256(variant_bytes).hexdigest(),
+                          'width': resized.width, 'height': resized.height}
+
+    with open(sidecar_path(master_path), 'w') as f:
+        json.dump(variants, f, indent=2)
+    return master_path
+
+
+def template_variants(template_path):
+    """Variants recorded for template_path, or {} for templates saved before them"""
+    try:
+        with open(sidecar_path(template_path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def template_variant(template_path, kind):
+    """Return (path, sha256 or None) of the kind variant, falling back to the master"""
+    variant = template_variants(template_path).get(kind)
+    if variant and os.path.exists(variant['path']):
+        return variant['path'], variant['sha256']
+    return template_path, None
@@ -0,0 +1,196 @@
+"""Certificate IDs, the issued-certificate index and signed bulk manifests.
+
+A certificate ID is an HMAC-SHA256 of the attendee's name and the layout
+version, keyed with a server secret (``CERTGEN_SECRET``, or a random key
+kept in SECRET_PATH), so IDs are deterministic but cannot be forged
+without the key. Every issued ID is recorded in a SQLite table keyed by
+the ID's sha256; verifying is a single primary-key lookup, independent
+of the roster and of how many certificates have been issued, and never
+re-renders anything.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import re
+import secrets
+import threading
+import time
+import unicodedata
+
+from .config import DEFAULT_CONFIG
+from .db import Database
+
+SECRET_PATH = '.certgen_secret'
+ISSUED_PATH = 'issued.db'
+# Base32 characters in an ID (80 bits), shown in groups of four
+ID_LENGTH = 16
+# Settings that change what is drawn; the output encoding does not count
+VERSION_KEYS = tuple(key for key in DEFAULT_CONFIG
+                     if key not in ('participants', 'output_format', 'output_options'))
+
+_secret = None
+_secret_lock = threading.Lock()
+
+
+def get_secret():
+    """The HMAC key: CERTGEN_SECRET, else SECRET_PATH (created on first use)"""
+    global _secret
+    with _secret_lock:
+        if _secret is None:
+            env_secret = os.environ.get('CERTGEN_SECRET')
+            if env_secret:
+                _secret = env_secret.encode()
+            else:
+                _secret = _load_secret_file(SECRET_PATH)
+        return _secret
+
+
+def _load_secret_file(path):
+    if not os.path.exists(path):
+        # Linking a finished file into place means no process reads it half-written
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(secrets.token_hex(32).encode())
+        try:
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+    with open(path, 'rb') as f:
+        return f.read().strip()
+
+
+def id_version(config):
+    """Short hash of the layout settings that certificate IDs are bound to"""
+    layout = {key: config.get(key, DEFAULT_CONFIG[key]) for key in VERSION_KEYS}
+    encoded = json.dumps(layout, sort_keys=True, default=list).encode()
+    return hashlib.sha256(encoded).hexdigest()[:12]
+
+
+def certificate_id(name, version, secret=None):
+    """Deterministic ID for name under a layout version, e.g. 'K3QF-7ZP2-...'"""
+    message = f"{unicodedata.normalize('NFC', name)}\0{version}".encode()
+    digest = hmac.new(secret or get_secret(), message, hashlib.sha256).digest()
+    raw = base64.b32encode(digest).decode()[:ID_LENGTH]
+    return '-'.join(raw[i:i + 4] for i in range(0, ID_LENGTH, 4))
+
+
+def normalize_certificate_id(text):
+    """Canonical ID from user input: a bare ID or a verification URL"""
+    match = re.search(r'[?&]verify=([^&#]+)', text)
+    if match:
+        text = match.group(1)
+    raw = re.sub(r'[^A-Z2-7]', '', text.upper())
+    if len(raw) != ID_LENGTH:
+        return None
+    return '-'.join(raw[i:i + 4] for i in range(0, ID_LENGTH, 4))
+
+
+def verification_payload(cert_id, verify_url=None):
+    """What a certificate's QR code encodes: a verification link or the bare ID"""
+    if not verify_url:
+        return cert_id
+    separator = '&' if '?' in verify_url else '?'
+    return f"{verify_url}{separator}verify={cert_id}"
+
+
+def _id_hash(cert_id):
+    return hashlib.sha256(cert_id.encode()).digest()
+
+
+class IssuedIndex:
+    """Persistent set of issued certificate IDs, keyed by their hash"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS issued (
+            id_hash   BLOB PRIMARY KEY,
+            name      TEXT NOT NULL,
+            version   TEXT NOT NULL,
+            issued_at REAL NOT NULL
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path=ISSUED_PATH):
+        self.path = path
+        self.db = Database(path, self.SCHEMA)
+
+    def record(self, entries):
+        """Add (certificate_id, name, version) entries in one transaction; return the new count"""
+        now = time.time()
+        with self.db.transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO issued (id_hash, name, version, issued_at) "
+                "VALUES (?, ?, ?, ?)",
+                ((_id_hash(cert_id), name, version, now) for cert_id, name, version in entries))
+            return conn.total_changes - before
+
+    def issue(self, name, version):
+        """Record name's certificate under version unless already issued; return its ID"""
+        cert_id = certificate_id(name, version)
+        if not self.db.connect().execute("SELECT 1 FROM issued WHERE id_hash = ?",
+                                       (_id_hash(cert_id),)).fetchone():
+            self.record([(cert_id, name, version)])
+        return cert_id
+
+    def lookup(self, text):
+        """Issue record for an ID (or verification URL), or None if it was never issued.
+
+        The stored name is re-checked against the ID's HMAC, so rows edited
+        or inserted without the secret do not verify.
+        """
+        cert_id = normalize_certificate_id(text)
+        if cert_id is None:
+            return None
+        row = self.db.connect().execute(
+            "SELECT name, version, issued_at FROM issued WHERE id_hash = ?",
+            (_id_hash(cert_id),)).fetchone()
+        if row is None:
+            return None
+        name, version, issued_at = row
+        if not hmac.compare_digest(certificate_id(name, version), cert_id):
+            return None
+        return {'certificate_id': cert_id, 'name': name, 'version': version,
+                'issued_at': issued_at}
+
+    def __len__(self):
+        return self.db.connect().execute("SELECT COUNT(*) FROM issued").fetchone()[0]
+
+
+def build_manifest(entries, version):
+    """Return (manifest bytes, hex HMAC signature) for [(certificate_id, name, filename), ...]"""
+    manifest = {
+        'version': version,
+        'issued_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'count': len(entries),
+        'certificates': [{'id': cert_id, 'name': name, 'file': filename}
+                         for cert_id, name, filename in entries],
+    }
+    data = json.dumps(manifest, ensure_ascii=False, indent=1).encode()
+    return data, sign_manifest(data)
+
+
+def sign_manifest(data, secret=None):
+    return hmac.new(secret or get_secret(), data, hashlib.sha256).hexdigest()
+
+
+def verify_manifest(data, signature, secret=None):
+    """True if signature is this server's signature of the manifest bytes"""
+    return hmac.compare_digest(sign_manifest(data, secret), signature.strip())
+
+
+_issued_index = None
+_issued_index_lock = threading.Lock()
+
+
+def get_issued_index():
+    """Return the process-wide IssuedIndex at CERTGEN_ISSUED (default issued.db)"""
+    global _issued_index
+    with _issued_index_lock:
+        if _issued_index is None:
+            _issued_index = IssuedIndex(os.environ.get('CERTGEN_ISSUED', ISSUED_PATH))
+        return _issued_index
@@ -0,0 +1,209 @@
+"""Background pre-rendering of every participant into the render cache.
+
+After the admin saves a layout, a WarmupJob renders the whole roster on a
+small, low-priority process pool so that release-day downloads are cache
+hits. Live requests always win: they never queue behind the job (a miss is
+rendered straight away by the requesting session), the job stops handing
+out new work while any live render is running, and names that a live
+request has already cached are skipped.
+"""
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from . import metrics
+from .bulk import _init_worker, _render_one
+from .cache import cache_key, get_render_cache, layout_hash, output_key
+from .encode import output_settings
+from .pool import worker_context
+from .render import certificate_kwargs
+
+# Added to the workers' nice value so the OS schedules live renders first
+WORKER_NICENESS = 10
+
+
+def default_workers():
+    """Leave half the cores for live requests"""
+    return max(1, (os.cpu_count() or 1) // 2)
+
+
+def _init_low_priority(template_path, kwargs, output):
+    try:
+        os.nice(WORKER_NICENESS)
+    except (AttributeError, OSError):
+        pass
+    _init_worker(template_path, kwargs, output)
+
+
+class PriorityGate:
+    """Counts live renders so background work can step aside for them"""
+
+    def __init__(self):
+        self._active = 0
+        self._idle = threading.Condition()
+
+    def live(self):
+        return _LiveRender(self)
+
+    def wait_idle(self, timeout=None):
+        """Block until no live render is running; return False on timeout"""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._active == 0, timeout)
+
+    @property
+    def active(self):
+        return self._active
+
+
+class _LiveRender:
+    def __init__(self, gate):
+        self.gate = gate
+
+    def __enter__(self):
+        with self.gate._idle:
+            self.gate._active += 1
+        return self
+
+    def __exit__(self, *exc):
+        with self.gate._idle:
+            self.gate._active -= 1
+            if self.gate._active == 0:
+                self.gate._idle.notify_all()
+        return False
+
+
+priority_gate = PriorityGate()
+
+
+class WarmupJob:
+    """Pre-renders names into the render cache from a background thread"""
+
+    def __init__(self, names, template_path, config, workers=None, cache=None):
+        self.names = list(dict.fromkeys(names))
+        self.template_path = template_path
+        self.kwargs = certificate_kwargs(config)
+        self.output = output_settings(config)
+        self.workers = workers or default_workers()
+        self.cache = cache or get_render_cache()
+        self.total = len(self.names)
+        self.rendered = 0
+        self.skipped = 0
+        self.errors = {}
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self._cancel = threading.Event()
+        self._thread = None
+
+    @property
+    def done(self):
+        return self.rendered + self.skipped + len(self.errors)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def eta(self):
+        """Estimated seconds until every name is cached, or None if unknown"""
+        if not self.running:
+            return 0.0 if self.finished_at else None
+        if not self.rendered:
+            return None
+        elapsed = time.monotonic() - self.started_at
+        return elapsed / self.rendered * (self.total - self.done)
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='certgen-warmup', daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _key(self, name, template_sha256):
+        return cache_key(name, layout_hash(self.kwargs), template_sha256,
+                         output_key(*self.output))
+
+    def _run(self):
+        try:
+            with open(self.template_path, 'rb') as f:
+                template_sha256 = hashlib.sha256(f.read()).hexdigest()
+            self._render_all(template_sha256)
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            self.finished_at = time.monotonic()
+
+    def _render_all(self, template_sha256):
+        queue = iter(self.names)
+        pending = {}
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=worker_context(),
+                                 initializer=_init_low_priority,
+                                 initargs=(self.template_path, self.kwargs, self.output)) as pool:
+            try:
+                def submit_next():
+                    for name in queue:
+                        key = self._key(name, template_sha256)
+                        # A live request may have rendered it already
+                        if self.cache.contains(key):
+                            self.skipped += 1
+                            continue
+                        pending[pool.submit(_render_one, name)] = (name, key)
+                        return True
+                    return False
+
+                exhausted = False
+                while not self._cancel.is_set():
+                    # Hand out new work only while no live render is running
+                    if (not exhausted and len(pending) < self.workers
+                            and priority_gate.wait_idle(timeout=0.5)):
+                        exhausted = not submit_next()
+                        continue
+                    if not pending:
+                        if exhausted:
+                            break
+                        continue
+                    finished, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        name, key = pending.pop(future)
+                        try:
+                            self.cache.put(key, future.result())
+                        except Exception as e:
+                            self.errors[name] = str(e)
+                        else:
+                            self.rendered += 1
+                            metrics.inc('certgen_warmup_renders_total')
+            finally:
+                for future in pending:
+                    future.cancel()
+                pool.shutdown(wait=True, cancel_futures=True)
+
+
+_current_job = None
+_job_lock = threading.Lock()
+
+
+def start_warmup(names, template_path, config, workers=None, cache=None):
+    """Cancel any running warm-up and start a new one for names"""
+    global _current_job
+    with _job_lock:
+        if _current_job is not None:
+            _current_job.cancel()
+        _current_job = WarmupJob(names, template_path, config, workers, cache).start()
+        return _current_job
+
+
+def current_warmup():
+    """Return the most recent WarmupJob in this process, or None"""
+    return _current_job